@@ -0,0 +1,91 @@
+"""
+Startup benchmark: the import time of `scriptpy.main` (from `python -X importtime`) and
+the wall time of a trivial `scriptpy` command line, each in a fresh interpreter, plus a
+check that modules only some snippets need are not imported up front.
+
+The import time can be held to a budget, and results compared with an earlier run:
+
+    python -m benchmarks.bench_startup --budget-ms 60
+    python -m benchmarks.bench_startup --json before.json
+    python -m benchmarks.bench_startup --baseline before.json [--fail-on-regression]
+"""
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+from benchmarks.results import add_result_arguments, report
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# modules that are imported when a snippet or an option needs them, never at startup
+DEFERRED = ("subprocess", "selectors", "shlex", "argparse", "json", "csv", "mmap", "socket", "cProfile")
+
+
+def run_python(*args, **kwargs):
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    return subprocess.run([sys.executable, *args], env=env, capture_output=True, text=True, check=True, **kwargs)
+
+
+def import_time(module: str) -> float:
+    """The cumulative import time of `module` in seconds, as reported by `-X importtime`."""
+    stderr = run_python("-X", "importtime", "-c", f"import {module}").stderr
+    for line in stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        fields = line.split("|")
+        if len(fields) == 3 and fields[2].strip() == module:
+            return int(fields[1]) / 1e6
+    raise RuntimeError(f"no import time reported for {module}")
+
+
+def wall_time(*args) -> float:
+    start = time.perf_counter()
+    run_python(*args)
+    return time.perf_counter() - start
+
+
+def loaded_deferred_modules() -> list:
+    """The `DEFERRED` modules imported by evaluating a snippet without shell commands."""
+    code = ("import sys; from scriptpy import custom_eval; custom_eval('[1, 2] | str')\n"
+            f"print(' '.join(m for m in {DEFERRED!r} if m in sys.modules))")
+    return run_python("-c", code).stdout.split()
+
+
+def startup_benchmarks(repeat):
+    yield "import[scriptpy.main]", min(import_time("scriptpy.main") for _ in range(repeat))
+    yield "import[scriptpy.client]", min(import_time("scriptpy.client") for _ in range(repeat))
+    bare = min(wall_time("-c", "pass") for _ in range(repeat))
+    yield "cli[1+1]", min(wall_time("-m", "scriptpy", "1+1") for _ in range(repeat)) - bare
+    yield "cli[shell]", min(wall_time("-m", "scriptpy", '$("true")') for _ in range(repeat)) - bare
+
+
+def format_ms(seconds: float) -> str:
+    return f"{seconds * 1000:.1f} ms"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--budget-ms", type=float,
+                        help="fail (exit status 1) when importing scriptpy.main takes longer than this")
+    add_result_arguments(parser)
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args(argv)
+
+    results, regressions = report(startup_benchmarks(args.repeat), args, format_ms, width=28)
+    failed = bool(regressions) and args.fail_on_regression
+    loaded = loaded_deferred_modules()
+    if loaded:
+        print(f"\nimported at startup but should be deferred: {', '.join(loaded)}")
+        failed = True
+    budget = args.budget_ms
+    if budget is not None and results["import[scriptpy.main]"] * 1000 > budget:
+        print(f"\nimporting scriptpy.main takes {format_ms(results['import[scriptpy.main]'])}, "
+              f"over the budget of {budget:g} ms")
+        failed = True
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
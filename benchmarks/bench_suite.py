@@ -0,0 +1,171 @@
+"""
+Benchmark suite: every phase of `custom_eval` on small, medium and generated-huge
+snippets, plus pipe throughput and shell command overhead.
+
+Each benchmark reports the best time per call over a few repetitions (warm caches,
+e.g. for auto-import probing). Results can be written as JSON and compared with a
+previous run:
+
+    python -m benchmarks.bench_suite --json before.json
+    python -m benchmarks.bench_suite --baseline before.json [--fail-on-regression]
+"""
+import argparse
+import ast
+import io
+import itertools
+import sys
+import time
+import tokenize
+
+from benchmarks.results import add_result_arguments, report
+from scriptpy.TokenEditor import TokenEditor
+from scriptpy.baseTransformer import rewrite_tokens
+from scriptpy.main import build_environment, custom_eval
+from scriptpy.smart_eval import balance_fix, balanced_tokens, run_compiled, smart_compile
+from scriptpy.transformers import transformers
+from scriptpy.transformers.command import ShellSession, shell_exec
+from scriptpy.transformers.pipes import PipeableList, _attr_pipe, materialize
+
+SMALL = "data | str |.zfill(8) |.upper()"
+
+MEDIUM = """\
+def describe(n):
+    kind = "even" if n % 2 == 0 else "odd"
+    return {"n": n, "kind": kind, "square": n * n}
+
+rows = data | describe
+evens = [r for r in rows if r["kind"] == "even"]
+names = evens | (lambda r: r["n"]) | str |.rjust(4, "0")
+report = {"count": len(evens), "total": sum(r["square"] for r in evens)}
+lines = names |.lower() |.strip()
+json.dumps(report) + ",".join(lines)
+"""
+
+
+def huge_snippet(lines: int) -> str:
+    body = "".join(f"v{i} = data | (lambda x: x + {i}) |.bit_length()\n" for i in range(lines))
+    return body + f"len(v{lines - 1})\n"
+
+
+def measure(fn, make_arg=None, repeat=5, min_time=0.02):
+    """
+    Best time per call of `fn(arg)`, with `arg` from `make_arg()` (prepared outside the
+    timing, e.g. a fresh AST for transforms that mutate it). Calls are batched so one
+    batch takes at least `min_time` seconds.
+    """
+    def batch(number):
+        args = [make_arg() if make_arg else None for _ in range(number)]
+        start = time.perf_counter()
+        for arg in args:
+            fn(arg)
+        return time.perf_counter() - start
+
+    number = 1
+    while (elapsed := batch(number)) < min_time and number < 1_000_000:
+        number *= 10 if elapsed < min_time / 10 else 2
+    best = elapsed
+    for _ in range(repeat - 1):
+        best = min(best, batch(number))
+    return best / number
+
+
+def phase_benchmarks(name, src, globals_, repeat, name_filter=""):
+    """
+    Time each phase of the compile pipeline (as in `compile_source`) and the run.
+    Only benchmarks whose name contains `name_filter` are measured.
+    """
+    options = dict(lazy_imports=False, known_names=frozenset(globals_))
+    tokens = list(balanced_tokens(src))
+    editor = TokenEditor(tokens)
+    rewrite_tokens(editor, transformers)
+    rewritten = tokenize.untokenize(editor.as_token_list())
+
+    def tree_before(index):
+        tree = ast.parse(rewritten)
+        for transformer in transformers[:index]:
+            tree = transformer(**options).visit(tree)
+        return tree
+
+    def transformed_tree():
+        return ast.fix_missing_locations(tree_before(len(transformers)))
+
+    codes = smart_compile(transformed_tree(), "<bench>")
+
+    # (name, function, argument factory); default arguments bind the loop variables
+    cases = [
+        ("balance_fix", lambda _: balance_fix(src), None),
+        ("tokenize", lambda _: list(tokenize.generate_tokens(io.StringIO(src).readline)), None),
+        ("balanced_tokens", lambda _: list(balanced_tokens(src)), None),
+    ]
+    cases += [(f"token[{transformer.__name__}]", transformer.token_level_transform, lambda: TokenEditor(tokens))
+              for transformer in transformers if transformer.token_patterns]
+    cases += [
+        ("token[fused]", lambda e: rewrite_tokens(e, transformers), lambda: TokenEditor(tokens)),
+        ("untokenize", lambda _: tokenize.untokenize(editor.as_token_list()), None),
+        ("parse", lambda _: ast.parse(rewritten), None),
+    ]
+    cases += [(f"ast[{transformer.__name__}]", lambda tree, t=transformer: t(**options).visit(tree),
+               lambda i=index: tree_before(i))
+              for index, transformer in enumerate(transformers)]
+    cases += [
+        ("compile", lambda tree: smart_compile(tree, "<bench>"), transformed_tree),
+        ("run", lambda _: materialize(run_compiled(codes, build_environment(globals_))), None),
+        ("custom_eval", lambda _: custom_eval(src, globals_), None),
+        ("custom_eval[no cache]", lambda _: custom_eval(src, globals_, cache=False), None),
+    ]
+    for case, fn, make_arg in cases:
+        if name_filter in f"{name}:{case}":
+            yield f"{name}:{case}", measure(fn, make_arg, repeat=repeat)
+
+
+def runtime_benchmarks(size, repeat, name_filter=""):
+    """Pipe throughput over `size` elements, and the cost of one shell command."""
+    data = list(range(size))
+    globals_ = {"data": data}
+    session = ShellSession()  # the shell only starts on the first command
+    cases = [
+        (f"pipe[fused]:{size}", lambda _: custom_eval(SMALL, globals_)),
+        (f"pipe[lazy]:{size}", lambda _: custom_eval(SMALL, globals_, lazy=True)),
+        (f"pipe[stagewise]:{size}",
+         lambda _: PipeableList(data) | str | _attr_pipe("zfill", 8) | _attr_pipe("upper")),
+        ("shell_exec", lambda _: shell_exec("true")),
+        ("shell_exec[session]", lambda _: session.run("true")),
+    ]
+    try:
+        for name, fn in cases:
+            if name_filter in name:
+                yield name, measure(fn, repeat=repeat)
+    finally:
+        session.close()
+
+
+def format_time(seconds: float) -> str:
+    for unit, scale in (("s", 1), ("ms", 1e-3), ("us", 1e-6)):
+        if seconds >= scale:
+            return f"{seconds / scale:.3g} {unit}"
+    return f"{seconds / 1e-9:.3g} ns"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    add_result_arguments(parser)
+    parser.add_argument("--filter", default="", help="only run benchmarks whose name contains this")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--huge-lines", type=int, default=2000, help="lines of the generated huge snippet")
+    parser.add_argument("--pipe-size", type=int, default=100_000, help="elements in the pipe benchmarks")
+    args = parser.parse_args(argv)
+
+    globals_ = {"data": list(range(100))}
+    suites = [
+        phase_benchmarks("small", SMALL, globals_, args.repeat, args.filter),
+        phase_benchmarks("medium", MEDIUM, globals_, args.repeat, args.filter),
+        phase_benchmarks("huge", huge_snippet(args.huge_lines), globals_, args.repeat, args.filter),
+        runtime_benchmarks(args.pipe_size, args.repeat, args.filter),
+    ]
+    _, regressions = report(itertools.chain.from_iterable(suites), args, format_time)
+    if regressions and args.fail_on_regression:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
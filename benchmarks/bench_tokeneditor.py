@@ -0,0 +1,76 @@
+"""
+Memory and time of the TokenEditor front-end on a ~100k-token input.
+
+Compares the current editor (parallel type/string arrays, one fused rewrite
+pass) with the previous storage (one dataclass instance per token, copied on
+every commit), replayed here as a reference. The reference only replays the
+storage and copies, not the pattern matching, so its time is a lower bound.
+
+    python -m benchmarks.bench_tokeneditor [--tokens N]
+"""
+import argparse
+import dataclasses
+import io
+import time
+import tokenize
+import tracemalloc
+
+from scriptpy.TokenEditor import TokenEditor
+from scriptpy.baseTransformer import rewrite_tokens
+from scriptpy.transformers import transformers
+
+LINE = "row = parse(items[i], sep=',') |.strip |.split(',') | len\n"
+
+
+@dataclasses.dataclass
+class DataclassToken:
+    type: int
+    string: str
+
+
+def dataclass_editor(src):
+    """The previous pipeline: a dataclass per token, a list copy per transformer and at the end."""
+    toks = list(tokenize.generate_tokens(io.StringIO(src).readline))
+    tokens = [DataclassToken(type=t.type, string=t.string) for t in toks]
+    for _ in transformers:
+        tokens = list(tokens)  # commit()
+    tokens = list(tokens)  # end()
+    return [(t.type, t.string) for t in tokens], tokens
+
+
+def array_editor(src):
+    editor = TokenEditor(tokenize.generate_tokens(io.StringIO(src).readline))
+    rewrite_tokens(editor, transformers)
+    return editor.as_token_list(), editor
+
+
+def measure(fn, src):
+    start = time.perf_counter()
+    fn(src)
+    elapsed = time.perf_counter() - start
+
+    tracemalloc.start()
+    result = fn(src)  # keep the result alive so its storage is counted
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return elapsed, current, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--tokens", type=int, default=100_000)
+    args = parser.parse_args()
+
+    tokens_per_line = len(list(tokenize.generate_tokens(io.StringIO(LINE).readline))) - 1
+    src = LINE * (args.tokens // tokens_per_line + 1)
+
+    print(f"{args.tokens:,}+ tokens")
+    print(f"{'storage':<12}{'time (ms)':>12}{'retained (MB)':>16}{'peak (MB)':>12}")
+    for name, fn in (("dataclass", dataclass_editor), ("array", array_editor)):
+        elapsed, current, peak = measure(fn, src)
+        print(f"{name:<12}{elapsed * 1000:>12.1f}{current / 1e6:>16.2f}{peak / 1e6:>12.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+"""
+Result handling shared by the benchmark scripts: printing each result as it is measured,
+comparing it with an earlier run (`--baseline`), and saving the results (`--json`).
+"""
+import json
+import platform
+import sys
+
+from scriptpy import __version__
+
+
+def add_result_arguments(parser):
+    parser.add_argument("--json", metavar="PATH", help="write the results to PATH as JSON")
+    parser.add_argument("--baseline", metavar="PATH", help="compare with the results of an earlier --json run")
+    parser.add_argument("--threshold", type=float, default=0.10,
+                        help="relative slowdown reported as a regression (default: 0.10)")
+    parser.add_argument("--fail-on-regression", action="store_true", help="exit with status 1 on a regression")
+
+
+def report(benchmarks, args, format_time, width=40):
+    """
+    Print every `(name, seconds)` of `benchmarks` as it comes in, next to its time in the
+    `args.baseline` run, and write them all to `args.json`. Returns the results and the
+    names of the benchmarks that got slower than `args.threshold` allows.
+    """
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+
+    results = {}
+    regressions = []
+    for name, seconds in benchmarks:
+        results[name] = seconds
+        line = f"{name:<{width}}{format_time(seconds):>12}"
+        if name in baseline:
+            ratio = seconds / baseline[name]
+            flag = ""
+            if ratio > 1 + args.threshold:
+                regressions.append(name)
+                flag = "  REGRESSION"
+            line += f"{format_time(baseline[name]):>12}{ratio:>8.2f}x{flag}"
+        print(line, flush=True)
+
+    if args.json:
+        meta = {"scriptpy": __version__, "python": sys.version.split()[0], "platform": platform.platform()}
+        with open(args.json, "w") as f:
+            json.dump({"meta": meta, "results": results}, f, indent=2)
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) over {args.threshold:.0%}: {', '.join(regressions)}")
+    return results, regressions
@@ -1,12 +1,14 @@
 import token
-import dataclasses
+from array import array
 from tokenize import TokenInfo
-from typing import List, Tuple, Union, Callable
-@dataclasses.dataclass
-class SimpleToken:
+from typing import Dict, Iterable, List, NamedTuple, Tuple, Union, Callable
+
+
+class SimpleToken(NamedTuple):
     type: int
     string: str
 
+
 class TokenEditor:
     """
     A utility class designed to simplify the process of manually editing and
@@ -16,6 +18,10 @@ class TokenEditor:
     inspect them, and build a new, transformed list of tokens without
     requiring manual index management or explicit list appending.
 
+    Tokens are stored compactly as two parallel arrays: the token types (one byte
+    each) and the token strings (interned, so repeated names share one object).
+    `SimpleToken` tuples are only created when a token is inspected.
+
     Usage:
     1. Initialize with a list of TokenInfo objects: `editor = TokenEditor(toks)`
     2. Loop using `while editor.has_more():`
@@ -26,35 +32,45 @@ class TokenEditor:
     5. Get the final result: `transformed_toks = editor.get_result()`
     """
 
-    def __init__(self, toks: List[TokenInfo]):
+    def __init__(self, toks: Iterable[TokenInfo]):
         """
-        Initializes the TokenEditor with a list of `TokenInfo` objects.
+        Initializes the TokenEditor with `TokenInfo` objects (or `(type, string)` pairs).
 
-        A copy of the input tokens is made to ensure that the original list
-        remains unchanged.
+        The tokens are copied into the editor's own storage, so the original list
+        remains unchanged; `toks` may also be a generator, which is consumed once.
 
         Args:
-            toks: The initial list of `TokenInfo` objects to be processed.
+            toks: The initial `TokenInfo` objects to be processed.
         """
-        self._input_tokens = [SimpleToken(type=x.type,string=x.string) for x in toks]
-        self._output_tokens = []         # This list will store the transformed tokens
-        self._current_idx = 0            # The internal pointer to the current token in _input_tokens
+        self._input_types = array('B')   # token types of the input
+        self._input_strings = []         # token strings of the input
+        add_type = self._input_types.append
+        add_string = self._input_strings.append
+        intern = {}.setdefault
+        for tok in toks:
+            add_type(tok[0])
+            add_string(intern(tok[1], tok[1]))
+
+        self._output_types = array('B')  # These two will store the transformed tokens
+        self._output_strings = []
+        self._current_idx = 0            # The internal pointer to the current input token
 
     @property
     def current(self) -> Union[SimpleToken, None]:
         """
-        Returns the `TokenInfo` object at the current position in the input list.
+        Returns the token at the current position in the input list.
 
         Returns `None` if the editor's internal pointer has reached or
         exceeded the end of the input token list.
         """
-        if self._current_idx < len(self._input_tokens):
-            return self._input_tokens[self._current_idx]
+        idx = self._current_idx
+        if idx < len(self._input_strings):
+            return SimpleToken(self._input_types[idx], self._input_strings[idx])
         return None
 
     def peek(self, offset: int = 1) -> Union[SimpleToken, None]:
         """
-        Returns a `TokenInfo` object located at an `offset` from the
+        Returns the token located at an `offset` from the
         current position in the input list, without moving the internal pointer.
 
         This allows you to look ahead in the token stream to identify patterns.
@@ -64,12 +80,12 @@ class TokenEditor:
                     A value of 1 (default) means looking at the very next token.
 
         Returns:
-            The `TokenInfo` object at the calculated offset, or `None` if the
+            The token at the calculated offset, or `None` if the
             offset falls outside the bounds of the input token list.
         """
         target_idx = self._current_idx + offset
-        if 0 <= target_idx < len(self._input_tokens):
-            return self._input_tokens[target_idx]
+        if 0 <= target_idx < len(self._input_strings):
+            return SimpleToken(self._input_types[target_idx], self._input_strings[target_idx])
         return None
 
     def advance(self, steps: int = 1):
@@ -86,22 +102,26 @@ class TokenEditor:
     def append_current(self):
         """
         Adds the `current` token (the token at the internal pointer's current
-        position) to the `_output_tokens` list and then advances the
+        position) to the output and then advances the
         internal pointer by one step.
 
         This is a convenience method for when a token is passed through
         without any specific transformation.
         """
-        if self.current:
-            self._output_tokens.append(self.current)
-            self.advance(1)
+        idx = self._current_idx
+        if idx < len(self._input_strings):
+            self._output_types.append(self._input_types[idx])
+            self._output_strings.append(self._input_strings[idx])
+            self._current_idx = idx + 1
 
     def append(self,type: int,string:str):
-        self.extend(SimpleToken(type=type, string=string))
+        self._output_types.append(type)
+        self._output_strings.append(string)
 
     def extend(self, *new_tokens: SimpleToken):
         """
-        Adds one or more `TokenInfo` objects directly to the `_output_tokens` list.
+        Adds one or more tokens (`SimpleToken`, `TokenInfo` or `(type, string)`
+        pairs) directly to the output.
         This method is used when you want to insert new tokens or replace existing
         ones with a new sequence.
 
@@ -110,12 +130,13 @@ class TokenEditor:
         also intend to "consume" tokens from the input stream after appending.
 
         """
-        self._output_tokens.extend(new_tokens)
+        for tok in new_tokens:
+            self.append(tok[0], tok[1])
 
     def skip(self, steps: int = 1):
         """
         Advances the internal pointer by the specified number of `steps` without
-        adding the skipped tokens to the `_output_tokens` list.
+        adding the skipped tokens to the output.
 
         This is useful when a sequence of input tokens is recognized and needs
         to be effectively "deleted" or replaced by new tokens added via `append()`.
@@ -126,33 +147,80 @@ class TokenEditor:
         """
         Checks if there are more tokens remaining in the input list to be processed.
         """
-        return self._current_idx < len(self._input_tokens)
+        return self._current_idx < len(self._input_strings)
+
+    def _copy_through(self, start: int, stop: int):
+        """Copies the input tokens in `[start, stop)` to the output in bulk."""
+        if start < stop:
+            self._output_types.extend(self._input_types[start:stop])
+            self._output_strings.extend(self._input_strings[start:stop])
+
+    def drain(self):
+        """
+        Appends every remaining input token to the output, leaving the pointer at the end.
+        """
+        end = len(self._input_strings)
+        self._copy_through(self._current_idx, end)
+        self._current_idx = max(self._current_idx, end)
+
+    def rewrite(self, patterns: Dict[str, List[Callable[["TokenEditor"], bool]]]):
+        """
+        Runs a single streaming pass over the remaining input.
+
+        For every token whose string is a key of `patterns`, the registered handlers
+        are tried in order until one returns True (meaning it consumed the pattern and
+        emitted its replacement). Tokens no handler claims are copied to the output.
+        """
+        strings = self._input_strings
+        end = len(strings)
+        idx = start = self._current_idx
+        while idx < end:
+            handlers = patterns.get(strings[idx])
+            if handlers:
+                # handlers may look at the output history, so bring it up to date first
+                self._copy_through(start, idx)
+                self._current_idx = start = idx
+                if any(handler(self) for handler in handlers):
+                    idx = start = self._current_idx
+                    continue
+            idx += 1
+        self._copy_through(start, end)
+        self._current_idx = max(idx, end)
 
     def get_result(self) -> List[SimpleToken]:
         """
         Finalizes the transformation and returns the complete list of
-        transformed `TokenInfo` objects.
+        transformed tokens.
 
         Before returning, this method ensures that any remaining tokens
         in the input list (those not explicitly processed by a transformation
         rule) are appended to the output list.
 
         Returns:
-            A `List` of `TokenInfo` objects representing the final,
+            A `List` of `SimpleToken` objects representing the final,
             transformed token stream.
         """
         # Automatically append any remaining tokens from the input
         # that were not explicitly handled by the transformation logic.
-        while self.has_more():
-            self.append_current()
-        return self._output_tokens
+        self.drain()
+        return list(map(SimpleToken, self._output_types, self._output_strings))
 
     def get_output_history(self, count: int) -> List[SimpleToken]:
         """
         Returns the last 'count' tokens that have been appended to the output list.
         Useful for looking at the context that has already been processed and emitted.
         """
-        return self._output_tokens[-count:] if count <= len(self._output_tokens) else list(self._output_tokens)
+        start = max(len(self._output_strings) - count, 0)
+        return list(map(SimpleToken, self._output_types[start:], self._output_strings[start:]))
+
+    def get_input_history(self, count: int) -> List[SimpleToken]:
+        """
+        Returns the last 'count' input tokens before the current position, as written in
+        the source (unlike the output history, which holds what other rewrites emitted).
+        """
+        stop = min(self._current_idx, len(self._input_strings))
+        start = max(stop - count, 0)
+        return list(map(SimpleToken, self._input_types[start:stop], self._input_strings[start:stop]))
 
     def as_token_list(self) -> List[Tuple[int, str]]:
         """
@@ -160,27 +228,27 @@ class TokenEditor:
         (token type, token string) for untokenize.
 
         """
-        return [(t.type, t.string) for t in self._output_tokens]
+        return list(zip(self._output_types, self._output_strings))
 
     def commit(self):
         """
         Commits the currently built output tokens as the new input tokens for subsequent operations.
         """
         # First, ensure any unprocessed tokens from the current input are moved to output
-        while self.has_more():
-            self.append_current()
+        self.drain()
 
-        # The output of this pass becomes the input for the next pass
-        self._input_tokens = list(self._output_tokens)
-        self._output_tokens = [] # Clear the output buffer for the next pass
+        # The output of this pass becomes the input for the next pass (no copy needed)
+        self._input_types, self._input_strings = self._output_types, self._output_strings
+        self._output_types, self._output_strings = array('B'), [] # Clear the output buffer for the next pass
         self._current_idx = 0 # Reset pointer to the beginning of the new input
 
     def end(self):
         """
         just change the input to the output, so the all methods like as_token_list() will return the output
         """
-        if self._output_tokens:
+        if self._output_strings:
             raise ValueError("end the editor only after commit()")
 
-        self._output_tokens = list(self._input_tokens)
-
+        self._output_types, self._output_strings = self._input_types, self._input_strings
+        self._input_types, self._input_strings = array('B'), []
+        self._current_idx = 0
@@ -1,3 +1,44 @@
-from .main import custom_eval
-from .transformers import transformers
-__all__ = ['custom_eval', 'transformers']
\ No newline at end of file
+import sys
+
+__version__ = "0.1.1"
+
+__all__ = ['custom_eval', 'compile', 'CompiledSnippet', 'cache_info', 'cache_clear', 'Timings', 'transformers']
+
+# The public API is loaded on first access (PEP 562), so importing the package (e.g.
+# by the thin `scriptpy.client`) doesn't pull in the compiler and the transformers.
+_lazy_attributes = {
+    'custom_eval': ('.main', 'custom_eval'),
+    'compile': ('.main', 'compile_snippet'),
+    'CompiledSnippet': ('.main', 'CompiledSnippet'),
+    'cache_info': ('.main', 'cache_info'),
+    'cache_clear': ('.main', 'cache_clear'),
+    'Timings': ('.timings', 'Timings'),
+    'transformers': ('.transformers', 'transformers'),
+}
+
+
+def __getattr__(name):
+    try:
+        module_name, attribute = _lazy_attributes[name]
+    except KeyError:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}") from None
+    from importlib import import_module
+
+    value = getattr(import_module(module_name, __name__), attribute)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
+
+
+class _Package(type(sys)):
+    def __setattr__(self, name, value):
+        # loading the `transformers` subpackage binds it here; keep the public list instead
+        if name == 'transformers' and isinstance(value, type(sys)):
+            value = value.transformers
+        super().__setattr__(name, value)
+
+
+sys.modules[__name__].__class__ = _Package
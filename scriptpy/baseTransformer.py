@@ -8,17 +8,63 @@ class BaseTransformer(ABC,ast.NodeTransformer):
     Base class for code transformations.
     """
     environment:dict = {}
+    # helpers replacing those of `environment` when running in lazy pipe mode
+    lazy_environment:dict = {}
 
-    @staticmethod
-    def token_level_transform(editor:TokenEditor)->None:
+    # Token-level rewrite rules, applied by a single fused pass shared by all transformers.
+    # Maps the string of a trigger token (e.g. "$") to a handler `handler(editor) -> bool`,
+    # called with the editor positioned on the trigger. A handler that recognizes its pattern
+    # consumes the input it replaces, emits the new tokens and returns True; otherwise it
+    # returns False without touching the editor.
+    token_patterns: dict = {}
+
+    def __init__(self, **options):
+        """
+        `options` are the compile options (e.g. `lazy_imports`), available as `self.options`.
+        """
+        super().__init__()
+        self.options = options
+
+    @classmethod
+    def token_level_transform(cls, editor:TokenEditor)->None:
         """
-        Abstract method to transform the code at the token level. (before AST visiting)
+        Transform the code at the token level. (before AST visiting)
+        By default this applies `token_patterns`; override it only for rewrites
+        that need a full pass over the tokens of their own.
         """
-        return
+        editor.rewrite(collect_token_patterns([cls]))
 
     def visit(self, node):
         """
         Visit a node and apply the transformation.
         This method can be overridden if needed.
         """
-        return super().visit(node)
\ No newline at end of file
+        return super().visit(node)
+
+
+def collect_token_patterns(transformers) -> dict:
+    """Merge the `token_patterns` of `transformers` into `{trigger: [handlers...]}`."""
+    patterns = {}
+    for transformer in transformers:
+        for trigger, handler in transformer.token_patterns.items():
+            patterns.setdefault(trigger, []).append(handler)
+    return patterns
+
+
+def rewrite_tokens(editor: TokenEditor, transformers) -> None:
+    """
+    Apply the token-level transforms of `transformers` to `editor`.
+
+    All `token_patterns` are dispatched in one streaming pass; only transformers that
+    override `token_level_transform` get a pass (and a `commit()`) of their own, after it.
+    The transformed tokens are left in the editor's output.
+    """
+    default = BaseTransformer.token_level_transform.__func__
+    fused = [t for t in transformers if getattr(t.token_level_transform, "__func__", None) is default]
+    custom = [t for t in transformers if t not in fused]
+
+    editor.rewrite(collect_token_patterns(fused))
+    for transformer in custom:
+        editor.commit()
+        transformer.token_level_transform(editor)
+    editor.drain()
@@ -0,0 +1,122 @@
+import importlib.util
+import marshal
+import os
+import sys
+import threading
+from collections import OrderedDict, namedtuple
+
+CacheInfo = namedtuple("CacheInfo", ["hits", "misses", "maxsize", "currsize"])
+
+
+class LRUCache:
+    """
+    A small bounded least-recently-used mapping, modeled after `functools.lru_cache`
+    but keyed explicitly so callers can decide what makes two entries equal.
+
+    `maxsize` can be changed at any time; the cache is trimmed on the next `put()`.
+    """
+
+    def __init__(self, maxsize: int = 128):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                value = self._data[key]
+            except KeyError:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > max(self.maxsize, 0):
+                self._data.popitem(last=False)
+
+    def clear(self):
+        """Drop every entry and reset the hit/miss counters."""
+        with self._lock:
+            self._data.clear()
+            self.hits = self.misses = 0
+
+    def info(self) -> CacheInfo:
+        return CacheInfo(self.hits, self.misses, self.maxsize, len(self._data))
+
+    def __len__(self):
+        return len(self._data)
+
+
+# ——— on-disk bytecode cache for script files ——————————————————————————
+
+def bytecode_cache_path(path: str):
+    """
+    Return the pycache-style location of the compiled form of the script at `path`,
+    e.g. `dir/__pycache__/job.py.scriptpy-0.1.1.cpython-311.pyc`, or `None` when
+    the interpreter has no cache tag.
+    """
+    from . import __version__
+
+    tag = sys.implementation.cache_tag
+    if tag is None:
+        return None
+    directory, name = os.path.split(os.path.abspath(path))
+    return os.path.join(directory, "__pycache__", f"{name}.scriptpy-{__version__}.{tag}.pyc")
+
+
+def _bytecode_header(path: str, source: bytes, key):
+    from . import __version__
+
+    st = os.stat(path)
+    return (__version__, key, st.st_mtime_ns, st.st_size, importlib.util.source_hash(source))
+
+
+def load_bytecode(path: str, source: bytes, key=()):
+    """
+    Return the code objects cached for the script at `path`, or `None` when there is
+    no cache entry or it does not match the current file (mtime, size and hash of
+    `source`), scriptpy version, Python version or `key`.
+    """
+    cache_path = bytecode_cache_path(path)
+    if cache_path is None:
+        return None
+    try:
+        with open(cache_path, "rb") as f:
+            if f.read(len(importlib.util.MAGIC_NUMBER)) != importlib.util.MAGIC_NUMBER:
+                return None
+            header, codes = marshal.load(f)
+        if header != _bytecode_header(path, source, key):
+            return None
+    except (OSError, EOFError, ValueError, TypeError):
+        return None
+    return codes
+
+
+def store_bytecode(path: str, source: bytes, codes, key=()):
+    """
+    Write `codes` to the bytecode cache of the script at `path`.
+    Failures (read-only directories, ...) are ignored, like Python does for `__pycache__`.
+    """
+    if sys.dont_write_bytecode:
+        return
+    cache_path = bytecode_cache_path(path)
+    if cache_path is None:
+        return
+    try:
+        payload = marshal.dumps((_bytecode_header(path, source, key), codes))
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        # write to a temporary file first so concurrent runs never see a partial cache
+        tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(importlib.util.MAGIC_NUMBER)
+            f.write(payload)
+        os.replace(tmp_path, cache_path)
+    except (OSError, ValueError):
+        pass
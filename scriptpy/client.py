@@ -0,0 +1,109 @@
+"""
+Thin client for a resident `scriptpy --server`: forwards the command line, working
+directory, environment and its own stdin/stdout/stderr (as file descriptors) to the
+server, and exits with the status the server reports. Takes the same arguments as
+`scriptpy`. When no server is listening, the command runs in this process instead.
+
+Only the standard library is used here, so the client starts fast.
+"""
+import json
+import os
+import socket
+import stat
+import struct
+import sys
+
+_LENGTH = struct.Struct(">I")
+_STATUS = struct.Struct(">i")
+
+
+def default_socket_path() -> str:
+    """
+    `$SCRIPTPY_SOCKET`, or a per-user socket in the runtime directory, or else in a
+    private `/tmp/scriptpy-<uid>` directory (see `check_private_directory`).
+    """
+    path = os.environ.get("SCRIPTPY_SOCKET")
+    if path:
+        return path
+    runtime_directory = os.environ.get("XDG_RUNTIME_DIR")
+    if runtime_directory:
+        return os.path.join(runtime_directory, f"scriptpy-{os.getuid()}.sock")
+    return os.path.join(_private_directory(), "scriptpy.sock")
+
+
+def _private_directory() -> str:
+    return os.path.join("/tmp", f"scriptpy-{os.getuid()}")
+
+
+def check_private_directory(path: str, create=False):
+    """
+    Raise `PermissionError` unless the directory `path` belongs to the current user and
+    only they can access it. With `create`, a missing directory is created that way.
+    """
+    if create:
+        try:
+            os.mkdir(path, 0o700)
+        except FileExistsError:
+            pass
+    info = os.lstat(path)
+    if not stat.S_ISDIR(info.st_mode) or info.st_uid != os.getuid() or info.st_mode & 0o077:
+        raise PermissionError(f"{path} must be a directory that only the current user can access")
+
+
+def check_server(sock: socket.socket, path: str):
+    """
+    Raise `PermissionError` unless the socket file `path` and the server process at the
+    other end of the connected `sock` belong to the current user. The request carries
+    the client's environment and stdio, so it must not go to a socket another local
+    user created.
+    """
+    uid = os.getuid()
+    owner = os.lstat(path).st_uid
+    if owner != uid:
+        raise PermissionError(f"{path} belongs to another user (uid {owner})")
+    if hasattr(socket, "SO_PEERCRED"):
+        _, peer_uid, _ = struct.unpack("3i", sock.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED,
+                                                             struct.calcsize("3i")))
+        if peer_uid != uid:
+            raise PermissionError(f"the server on {path} runs as another user (uid {peer_uid})")
+
+
+def send_request(sock: socket.socket, argv: list) -> int:
+    """Send one request over the connected `sock` and return the exit status of the command."""
+    header = json.dumps({"argv": argv, "cwd": os.getcwd(), "env": dict(os.environ)}).encode()
+    sock.sendmsg(
+        [_LENGTH.pack(len(header)), header],
+        [(socket.SOL_SOCKET, socket.SCM_RIGHTS, struct.pack("3i", 0, 1, 2))],
+    )
+    status = b""
+    while len(status) < _STATUS.size:
+        chunk = sock.recv(_STATUS.size - len(status))
+        if not chunk:
+            raise ConnectionError("the scriptpy server closed the connection")
+        status += chunk
+    return _STATUS.unpack(status)[0]
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else list(argv)
+    sys.stdout.flush()
+    sys.stderr.flush()
+    path = default_socket_path()
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        try:
+            sock.connect(path)
+            check_server(sock, path)
+        except (FileNotFoundError, ConnectionRefusedError, PermissionError) as e:
+            if isinstance(e, PermissionError):
+                print(f"scriptpy-client: not using the server: {e}", file=sys.stderr)
+            from .main import main as run_locally
+
+            return run_locally(argv)
+        sys.exit(send_request(sock, argv))
+    finally:
+        sock.close()
+
+
+if __name__ == "__main__":
+    main()
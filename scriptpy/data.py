@@ -0,0 +1,115 @@
+"""
+Loaders for the `-d/--data` input of the command line: they turn a file (or stdin,
+as `-`) into the `data` variable of the snippet.
+"""
+import mmap
+import os
+import stat
+import sys
+from contextlib import nullcontext
+
+from .transformers.pipes import PipeableIter
+
+DATA_MODES = ("text", "lines", "mmap", "json", "jsonl", "csv")
+# modes whose `data` is a lazy pipe of records, read as they are consumed
+STREAMING_MODES = ("lines", "jsonl", "csv")
+
+
+def _open(path: str, binary=False, newline=None):
+    if path == "-":
+        if newline is not None and not binary and hasattr(sys.stdin, "reconfigure"):
+            sys.stdin.reconfigure(newline=newline)
+        return nullcontext(sys.stdin.buffer if binary else sys.stdin)
+    return open(path, "rb" if binary else "r", newline=newline)
+
+
+def read_text(path: str) -> str:
+    """The whole input as one string."""
+    with _open(path) as f:
+        return f.read()
+
+
+def _iter_lines(path: str):
+    with _open(path) as f:
+        for line in f:
+            yield line[:-1] if line.endswith("\n") else line
+
+
+def iter_lines(path: str) -> PipeableIter:
+    """
+    A lazy pipe of the input lines (without the newline). The input is read as the
+    lines are consumed, so memory stays bounded no matter the input size.
+    """
+    return PipeableIter(_iter_lines(path))
+
+
+def map_file(path: str):
+    """
+    The input as a read-only `mmap.mmap` (a bytes-like buffer that supports slicing,
+    `find()`, `readline()` and `re` patterns); pages are loaded by the OS on access.
+    stdin can only be mapped when it is redirected from a regular file. An empty
+    input maps to `b""`.
+    """
+    with _open(path, binary=True) as f:
+        fileno = f.fileno()
+        st = os.fstat(fileno)
+        if not stat.S_ISREG(st.st_mode):
+            raise ValueError(f"can't memory-map {path!r}: not a regular file (use --data-mode lines)")
+        if st.st_size == 0:
+            return b""
+        # the mapping stays valid after the file is closed
+        return mmap.mmap(fileno, 0, access=mmap.ACCESS_READ)
+
+
+def read_json(path: str):
+    """The input parsed as one JSON document (the raw text is dropped once parsed)."""
+    import json
+
+    with _open(path, binary=True) as f:
+        return json.loads(f.read())
+
+
+def _iter_json_lines(path: str):
+    import json
+
+    decode = json.loads
+    with _open(path, binary=True) as f:
+        for line in f:
+            if not line.isspace():
+                yield decode(line)
+
+
+def iter_json_lines(path: str) -> PipeableIter:
+    """A lazy pipe of the values of a JSON Lines input (one JSON document per line; blank lines are skipped)."""
+    return PipeableIter(_iter_json_lines(path))
+
+
+def _iter_csv(path: str):
+    import csv
+
+    with _open(path, newline="") as f:
+        yield from csv.DictReader(f)
+
+
+def iter_csv(path: str) -> PipeableIter:
+    """A lazy pipe of the rows of a CSV input with a header line, as dicts (`csv.DictReader`)."""
+    return PipeableIter(_iter_csv(path))
+
+
+_loaders = {
+    "text": read_text,
+    "lines": iter_lines,
+    "mmap": map_file,
+    "json": read_json,
+    "jsonl": iter_json_lines,
+    "csv": iter_csv,
+}
+
+
+def load_data(path: str, mode: str = "text"):
+    """Load the input at `path` (`-` for stdin) as the `data` variable, according to `mode`."""
+    try:
+        loader = _loaders[mode]
+    except KeyError:
+        raise ValueError(f"unknown data mode {mode!r}, expected one of {', '.join(DATA_MODES)}") from None
+    return loader(path)
@@ -1,65 +1,252 @@
-import argparse
 import ast
-import io
 import linecache
 import tokenize
 import sys
 
 from .TokenEditor import TokenEditor
+from .baseTransformer import rewrite_tokens
 
+from .cache import LRUCache, load_bytecode, store_bytecode
+from .timings import NO_TIMINGS, Timings
 from .transformers import transformers
-from .smart_eval import balance_fix, smart_parse, smart_run
+from .transformers.pipes import PipeTrace, materialize
+from .smart_eval import balanced_tokens, smart_compile, run_compiled
 
+# compiled snippets, keyed by (source, active transformers)
+code_cache = LRUCache(maxsize=256)
 
 
+def cache_info():
+    """Return hit/miss statistics of the compiled-code cache used by `custom_eval`."""
+    return code_cache.info()
 
-def custom_eval(src: str, globals_: dict | None = None,verbose=False):
-    # ——— 1) token-level rewrite of “|.name…” → “| _apipe('name',…)”
-    src = balance_fix(src)
-
-
-    toks = list(tokenize.generate_tokens(io.StringIO(src).readline))
 
+def cache_clear():
+    """Empty the compiled-code cache used by `custom_eval`."""
+    code_cache.clear()
 
-    editor = TokenEditor(toks)
-
-    for transformer in transformers:
-        transformer.token_level_transform(editor)
-        editor.commit()
 
-    editor.end() # make sure output is not empty
-    rewritten = tokenize.untokenize(editor.as_token_list())
+def compile_source(src: str, filename: str = '<main>', verbose=False, lazy_imports=False, known_names=frozenset(),
+                   timings=NO_TIMINGS, trace_pipes=False):
+    """
+    Run the full scriptpy pipeline (token rewrite, AST transforms) on `src`
+    and compile the result into a `(body_code, expr_code)` pair for `run_compiled`.
+    With `lazy_imports`, auto-imported modules are only loaded when first used.
+    `known_names` are the globals the code will run with (never auto-imported).
+    With `trace_pipes`, pipe chains carry the source of their stages for `PipeTrace`.
+    The time of each phase is recorded in `timings`.
+    """
+    # ——— 1) token-level rewrite of “|.name…” → “| _apipe('name',…)”
+    # src is tokenized exactly once: unclosed brackets are closed in the token stream,
+    # and the editor consumes the generator directly, no intermediate list of TokenInfo
+    with timings.phase("tokenize"):
+        editor = TokenEditor(balanced_tokens(src))
+    with timings.phase("token rewrite"):
+        rewrite_tokens(editor, transformers)
+        rewritten = tokenize.untokenize(editor.as_token_list())
 
-    filename = '<main>'
     # using here rewritten for accurate syntax errors
     linecache.cache[filename] = (len(rewritten.encode('utf-8')), None, rewritten.splitlines(keepends=True) , filename)
 
 
     # ——— 2) AST parse & transform
-    tree = smart_parse(rewritten, filename=filename)
+    # no smart_parse() here: the token stream is already balanced
+    with timings.phase("parse"):
+        tree = ast.parse(rewritten, mode="exec", filename=filename)
 
     # update linecache here to use the original src for better errors.
     linecache.cache[filename] = (len(src.encode('utf-8')), None, src.splitlines(keepends=True) , filename)
 
     for transformer in transformers:
-        tree = transformer().visit(tree)
+        with timings.phase(f"transform: {transformer.__name__}"):
+            tree = transformer(lazy_imports=lazy_imports, known_names=known_names,
+                               trace_pipes=trace_pipes).visit(tree)
 
     ast.fix_missing_locations(tree)
     if verbose:
         print(f"[DEBUG] Transformed code:```\n{ast.unparse(tree).strip()}\n```\n")
-    # code = compile(tree, filename, 'eval')
 
-    # ——— 3) eval with our small helpers in scope
+    with timings.phase("compile"):
+        return smart_compile(tree, filename)
+
+
+class CompiledSnippet:
+    """
+    A scriptpy snippet compiled once, to be run many times with different data.
+
+    Like `custom_eval`, running it executes the snippet and returns the value of
+    its last expression (or `None`). Create one with `scriptpy.compile(src)`.
+    """
+
+    def __init__(self, src: str, codes, filename: str = '<main>'):
+        self.src = src
+        self.filename = filename
+        self.codes = codes
+        self._lines = (len(src.encode('utf-8')), None, src.splitlines(keepends=True), filename)
+
+    def run(self, globals_: dict | None = None, lazy=False, timings=None, trace_pipes=False):
+        """
+        Run the snippet with `globals_` (plus the transformers' helpers) as its globals.
+        With `lazy`, pipes are chained generators, materialized only in the returned value.
+        The run time (and profile) is recorded in `timings`, a `Timings`.
+        With `trace_pipes`, per-stage statistics of the pipe chains are printed to stderr
+        afterwards (or collected into `trace_pipes`, if it is a `PipeTrace`). The stages
+        are labeled with their source if the snippet was compiled with `trace_pipes`.
+        """
+        pipe_trace = PipeTrace() if trace_pipes is True else trace_pipes or None
+        try:
+            return self.run_in(build_environment(globals_, lazy=lazy, pipe_trace=pipe_trace), timings)
+        finally:
+            if trace_pipes is True:
+                print(pipe_trace.report(), file=sys.stderr)
+
+    def run_in(self, env: dict, timings=None):
+        """
+        Run the snippet directly in `env` (see `build_environment`) instead of a fresh
+        environment, so the names it assigns are seen by later runs with the same `env`.
+        """
+        # keep tracebacks pointing at this snippet
+        linecache.cache[self.filename] = self._lines
+        with (timings or NO_TIMINGS).phase("run", profile=True):
+            return materialize(run_compiled(self.codes, env))
+
+    def run_many(self, iterable_of_globals, lazy=False):
+        """
+        Lazily run the snippet once per globals dict in `iterable_of_globals`,
+        yielding each result. Every run gets its own fresh environment.
+        """
+        linecache.cache[self.filename] = self._lines
+        base_env = build_environment(lazy=lazy)
+        body_code, expr_code = self.codes
+        for globals_ in iterable_of_globals:
+            env = base_env.copy()
+            if globals_:
+                env.update(globals_)
+            if body_code is not None:
+                exec(body_code, env)
+            yield materialize(eval(expr_code, env)) if expr_code is not None else None
+
+    def __repr__(self):
+        return f"<CompiledSnippet {self.src!r}>"
+
+
+def compile_snippet(src: str, verbose=False, cache=True, lazy_imports=False, known_names=(),
+                    timings=None, trace_pipes=False) -> CompiledSnippet:
+    """
+    Compile `src` into a reusable `CompiledSnippet` (exported as `scriptpy.compile`).
+    Results are shared through the compiled-code cache unless `cache` is false.
+
+    `known_names` are the names the snippet's globals will provide; they are treated
+    as variables, so e.g. a global called `json` is never shadowed by an auto-import.
+    The time of each compile phase is recorded in `timings`, a `Timings`. With
+    `trace_pipes`, the pipe chains are compiled with labels for `PipeTrace`.
+    """
+    timings = timings or NO_TIMINGS
+    known_names = frozenset(known_names)
+    trace_pipes = bool(trace_pipes)
+    key = (src, tuple(transformers), lazy_imports, known_names, trace_pipes)
+
+    # verbose always recompiles so the transformed code gets printed
+    compiled = code_cache.get(key) if cache and not verbose else None
+    timings.cache_hit = compiled is not None
+    if compiled is None:
+        codes = compile_source(src, verbose=verbose, lazy_imports=lazy_imports, known_names=known_names,
+                               timings=timings, trace_pipes=trace_pipes)
+        compiled = CompiledSnippet(src, codes)
+        if cache:
+            code_cache.put(key, compiled)
+    return compiled
+
+
+def custom_eval(src: str, globals_: dict | None = None,verbose=False, cache=True, lazy=False, lazy_imports=False,
+                timings=None, trace_pipes=False):
+    compiled = compile_snippet(src, verbose=verbose, cache=cache, lazy_imports=lazy_imports,
+                               known_names=globals_ or (), timings=timings, trace_pipes=trace_pipes)
+    return compiled.run(globals_, lazy=lazy, timings=timings, trace_pipes=trace_pipes)
+
+
+def build_environment(globals_: dict | None = None, lazy=False, pipe_trace: PipeTrace | None = None) -> dict:
+    """
+    Return the globals a compiled snippet runs with: the transformers' helpers plus `globals_`.
+    `lazy` selects the transformers' lazy pipe helpers; with a `pipe_trace`, pipe chains
+    are measured stage by stage into it.
+    """
     env = {}
     for transformer in transformers:
         env.update(transformer.environment)
+        if lazy:
+            env.update(transformer.lazy_environment)
+    if pipe_trace is not None:
+        env.update(pipe_trace.environment())
 
     if globals_:
         env.update(globals_)
-    return smart_run(tree, globals_dict=env, filename=filename)
+    return env
+
+
+def compile_script(path: str, src: str, use_cache=True, verbose=False, lazy_imports=False,
+                   known_names=(), timings=None, trace_pipes=False) -> CompiledSnippet:
+    """
+    Like `compile_snippet`, for the script file at `path` (whose content is `src`).
+    The code objects are stored in a pycache-style file next to the script,
+    so later runs of an unchanged script skip tokenizing and AST work entirely.
+    """
+    source = src.encode('utf-8')
+    known_names = frozenset(known_names)
+    key = (tuple(f"{t.__module__}.{t.__qualname__}" for t in transformers), lazy_imports, tuple(sorted(known_names)),
+           trace_pipes)
+
+    timings = timings or NO_TIMINGS
+    codes = load_bytecode(path, source, key) if use_cache and not verbose else None
+    timings.cache_hit = codes is not None
+    if codes is None:
+        codes = compile_source(src, verbose=verbose, lazy_imports=lazy_imports, known_names=known_names,
+                               timings=timings, trace_pipes=trace_pipes)
+        if use_cache:
+            store_bytecode(path, source, codes, key)
+    return CompiledSnippet(src, codes)
+
+
+def run_per_line(compiled: CompiledSnippet, lines, env: dict, print_lines=False, out=None, timings=None):
+    """
+    Run `compiled` once per element of `lines`, bound as `line` in `env`, which all runs
+    share (so e.g. counters set up in a BEGIN block carry over). Non-None results are
+    written to `out` (stdout by default), one per line; with `print_lines`, the value of
+    `line` is written after every run instead, like `perl -p`. All runs count as one
+    "run" phase of `timings`.
+    """
+    out = out or sys.stdout
+    # like awk and perl, output goes out line by line on a terminal and in blocks otherwise
+    # (even with PYTHONUNBUFFERED). The buffering is the stream's own, so what the code
+    # itself print()s stays in order with the results.
+    buffering = getattr(out, "write_through", False), getattr(out, "line_buffering", False)
+    rebuffer = any(buffering) and not out.isatty()
+    if rebuffer:
+        out.reconfigure(write_through=False, line_buffering=False)
+    write = out.write
+    linecache.cache[compiled.filename] = compiled._lines
+    body_code, expr_code = compiled.codes
+    try:
+        with (timings or NO_TIMINGS).phase("run", profile=True):
+            for line in lines:
+                env['line'] = line
+                if body_code is not None:
+                    exec(body_code, env)
+                result = eval(expr_code, env) if expr_code is not None else None
+                if print_lines:
+                    write(f"{env['line']}\n")
+                elif result is not None:
+                    write(f"{materialize(result)}\n")
+    finally:
+        if rebuffer:
+            out.reconfigure(write_through=buffering[0], line_buffering=buffering[1])
 
 
-def main():
+def main(argv=None):
+    # command-line only modules are imported here, not when scriptpy is used as a library
+    import argparse
+    from .data import DATA_MODES, STREAMING_MODES, load_data
+
     parser = argparse.ArgumentParser(
     description="Run scriptpy code snippets or script files, with optional data input."
 )
@@ -81,27 +268,121 @@ def main():
         dest='data_file',
         help="Filename to read as 'data' variable; use '-' for stdin"
     )
+    parser.add_argument(
+        '--data-mode',
+        choices=DATA_MODES,
+        default='text',
+        help="How to load the -d input: 'text' (one string, the default), 'lines' (a lazy pipe of lines, "
+             "for inputs of any size), 'mmap' (a read-only memory-mapped bytes buffer), 'json' (the parsed "
+             "document), 'jsonl' or 'csv' (lazy pipes of parsed records)"
+    )
+    for mode in ('json', 'jsonl', 'csv'):
+        parser.add_argument(
+            f'--{mode}',
+            dest='data_mode',
+            action='store_const',
+            const=mode,
+            help=f"Same as --data-mode {mode}"
+        )
     parser.add_argument(
         '-c',
         dest='csnippet',
         help=argparse.SUPPRESS,
     )
 
+    parser.add_argument(
+        '-n',
+        dest='per_line',
+        action='store_true',
+        help="Run the code once per input line (from -d, or stdin; a record with --jsonl/--csv), bound as "
+             "'line'; print non-None results"
+    )
+    parser.add_argument(
+        '-p',
+        dest='print_lines',
+        action='store_true',
+        help="Like -n, but print 'line' (which the code may reassign) after every run"
+    )
+    parser.add_argument(
+        '--begin',
+        metavar='CODE',
+        help="With -n/-p: code to run once before the first line"
+    )
+    parser.add_argument(
+        '--end',
+        metavar='CODE',
+        help="With -n/-p: code to run once after the last line; its result is printed"
+    )
+
     parser.add_argument(
         '-v', '--verbose',
         action='store_true',
         help="Enable verbose output"
     )
+    parser.add_argument(
+        '--lazy',
+        action='store_true',
+        help="Evaluate pipes lazily, streaming each element through all stages (constant memory)"
+    )
+    parser.add_argument(
+        '--lazy-imports',
+        action='store_true',
+        help="Load auto-imported modules only when they are first used"
+    )
+    parser.add_argument(
+        '--shell-session',
+        action='store_true',
+        help="Run $(...) commands in one persistent shell instead of a new shell per command"
+    )
+    parser.add_argument(
+        '--timings',
+        action='store_true',
+        help="Print the time spent in each compile phase, transformer and the run to stderr"
+    )
+    parser.add_argument(
+        '--profile',
+        action='store_true',
+        help="Profile the run with cProfile and print the statistics to stderr"
+    )
+    parser.add_argument(
+        '--trace-pipes',
+        action='store_true',
+        help="Print per-stage statistics of the pipe chains (elements, time, peak size) to stderr"
+    )
+    parser.add_argument(
+        '--server',
+        nargs='?',
+        const='',
+        metavar='SOCKET',
+        help="Run as a resident server on a Unix socket (default: $SCRIPTPY_SOCKET or a per-user socket), "
+             "serving the command lines of scriptpy-client with warm imports and caches"
+    )
+    parser.add_argument(
+        '--no-cache',
+        dest='use_cache',
+        action='store_false',
+        help="Don't read or write the compiled-script cache (__pycache__ next to the script)"
+    )
+
+    args = parser.parse_args(argv)
 
-    args = parser.parse_args()
+    if args.server is not None:
+        from .server import serve
+        try:
+            serve(args.server or None)
+        except RuntimeError as e:
+            parser.error(str(e))
+        return
 
     # Determine code source: script file or positional snippet
+    script_path = None
     if args.filename:
         if args.filename == '-':
             code_to_run = sys.stdin.read()
         else:
             with open(args.filename, 'r') as f:
                 code_to_run = f.read()
+            script_path = args.filename
     elif args.snippet:
         code_to_run = args.snippet
     elif args.csnippet: # allow "-c" just because people use that in python
@@ -109,22 +390,90 @@ def main():
     else:
         parser.error('No code provided. Use positional snippet or -s/--script for files.')
 
+    per_line = args.per_line or args.print_lines
+    if (args.begin or args.end) and not per_line:
+        parser.error('--begin/--end require -n or -p')
+    if per_line and args.filename == '-' and args.data_file in (None, '-'):
+        parser.error('-n/-p read lines from stdin, pass the script as a file or the input with -d')
+    if per_line and args.data_mode not in ('text', *STREAMING_MODES):
+        parser.error(f"-n/-p need input in lines or records ({', '.join(STREAMING_MODES)}), "
+                     f"not --data-mode {args.data_mode}")
+
     # Load data if requested
     globals_dict = {}
-    if args.data_file:
-        if args.data_file == '-':
-            data_content = sys.stdin.read()
+    if per_line:
+        pass  # the input is read line by line below
+    elif args.data_file:
+        try:
+            globals_dict['data'] = load_data(args.data_file, args.data_mode)
+        except ValueError as e:
+            parser.error(str(e))
+
+    if args.shell_session:
+        from .transformers.command import use_shell_session
+        use_shell_session()
+
+    timings = Timings(profile=args.profile) if args.timings or args.profile else None
+    try:
+        if per_line:
+            _main_per_line(args, code_to_run, script_path, globals_dict, timings)
+            return
+
+        # Execute and print result
+        if script_path:
+            compiled = compile_script(script_path, code_to_run, use_cache=args.use_cache, verbose=args.verbose,
+                                      lazy_imports=args.lazy_imports, known_names=globals_dict, timings=timings,
+                                      trace_pipes=args.trace_pipes)
+            result = compiled.run(globals_dict, lazy=args.lazy, timings=timings, trace_pipes=args.trace_pipes)
         else:
-            with open(args.data_file, 'r') as df:
-                data_content = df.read()
-        globals_dict['data'] = data_content
+            result = custom_eval(code_to_run, globals_=globals_dict or None, verbose=args.verbose, lazy=args.lazy,
+                                 lazy_imports=args.lazy_imports, timings=timings, trace_pipes=args.trace_pipes)
+        if result is not None:
+            print(result)
+    finally:
+        if args.timings:
+            print(timings.report(), file=sys.stderr)
+        if args.profile:
+            sys.stdout.flush()
+            timings.print_stats(sys.stderr)
+
 
-    # Execute and print result
-    result = custom_eval(code_to_run, globals_=globals_dict or None, verbose=args.verbose)
-    if result is not None:
-        print(result)
 
+def _main_per_line(args, code_to_run, script_path, globals_dict, timings=None):
+    """The -n/-p mode of `main`: compile everything once, then run the code per input line."""
+    from .data import STREAMING_MODES, load_data
+
+    options = dict(verbose=args.verbose, lazy_imports=args.lazy_imports, known_names={'line', *globals_dict},
+                   timings=timings, trace_pipes=args.trace_pipes)
+    if script_path:
+        compiled = compile_script(script_path, code_to_run, use_cache=args.use_cache, **options)
+    else:
+        compiled = compile_snippet(code_to_run, **options)
+    # the main code's cache status is the one worth reporting
+    cache_hit = timings.cache_hit if timings else None
+    begin = compile_snippet(args.begin, **options) if args.begin else None
+    end = compile_snippet(args.end, **options) if args.end else None
+    if timings:
+        timings.cache_hit = cache_hit
 
+    pipe_trace = PipeTrace() if args.trace_pipes else None
+    env = build_environment(globals_dict, lazy=args.lazy, pipe_trace=pipe_trace)
+    try:
+        if begin is not None:
+            result = begin.run_in(env, timings)
+            if result is not None:
+                print(result)
+        # streaming formats give one parsed record per run, text one line
+        mode = args.data_mode if args.data_mode in STREAMING_MODES else 'lines'
+        run_per_line(compiled, load_data(args.data_file or '-', mode), env, print_lines=args.print_lines,
+                     timings=timings)
+        if end is not None:
+            result = end.run_in(env, timings)
+            if result is not None:
+                print(result)
+    finally:
+        if pipe_trace is not None:
+            print(pipe_trace.report(), file=sys.stderr)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,157 @@
+"""
+Resident mode (`scriptpy --server`): one long-lived process that keeps the interpreter,
+the imported modules and the compiled-code caches warm, and runs the command lines
+that `scriptpy.client` forwards over a Unix socket, one request at a time.
+
+For each request the server takes over the client's stdin/stdout/stderr (passed as file
+descriptors), working directory and environment, so the command (and the shell
+commands it starts) behaves as if it ran in the client.
+"""
+import contextlib
+import json
+import os
+import signal
+import socket
+import sys
+import traceback
+
+from .client import _LENGTH, _STATUS, _private_directory, check_private_directory, default_socket_path
+
+
+def _recv_request(conn: socket.socket):
+    data, fds = b"", []
+    try:
+        while len(data) < _LENGTH.size or len(data) < _LENGTH.size + _LENGTH.unpack_from(data)[0]:
+            chunk, new_fds, _, _ = socket.recv_fds(conn, 65536, 3)
+            fds += new_fds
+            if not chunk:
+                raise ConnectionError("the client disconnected")
+            data += chunk
+        if len(fds) != 3:
+            raise ValueError(f"expected the client's stdin, stdout and stderr, got {len(fds)} descriptors")
+        request = json.loads(data[_LENGTH.size:])
+        if not (
+            isinstance(request, dict) and isinstance(request.get("argv"), list)
+            and isinstance(request.get("cwd"), str) and isinstance(request.get("env"), dict)
+        ):
+            raise ValueError("expected a request with 'argv', 'cwd' and 'env'")
+        return request, fds
+    except BaseException:
+        for fd in fds:
+            os.close(fd)
+        raise
+
+
+@contextlib.contextmanager
+def _client_context(request: dict, fds: list):
+    """Run the body with the client's stdio, working directory and environment."""
+    saved_fds = [os.dup(fd) for fd in range(3)]
+    saved_streams = sys.stdin, sys.stdout, sys.stderr
+    saved_cwd = os.getcwd()
+    saved_env = dict(os.environ)
+    try:
+        for fd, client_fd in enumerate(fds):
+            os.dup2(client_fd, fd)
+        # fresh stream objects: no data buffered from an earlier request, and the
+        # client's kind of output (e.g. line buffering on a terminal)
+        sys.stdin = open(0, "r", closefd=False)
+        sys.stdout = open(1, "w", closefd=False)
+        sys.stderr = open(2, "w", buffering=1, errors="backslashreplace", closefd=False)
+        os.chdir(request["cwd"])
+        os.environ.clear()
+        os.environ.update(request["env"])
+        yield
+    finally:
+        for stream in (sys.stdout, sys.stderr, sys.stdin):
+            if stream not in saved_streams:
+                with contextlib.suppress(OSError):
+                    stream.close()
+        sys.stdin, sys.stdout, sys.stderr = saved_streams
+        for fd, saved_fd in enumerate(saved_fds):
+            os.dup2(saved_fd, fd)
+            os.close(saved_fd)
+        for fd in fds:
+            os.close(fd)
+        os.chdir(saved_cwd)
+        os.environ.clear()
+        os.environ.update(saved_env)
+
+
+def _run(argv: list) -> int:
+    """Run `scriptpy argv` and return its exit status."""
+    from .main import main
+    from .transformers.command import use_shell_session
+
+    if "--server" in argv:
+        print("scriptpy: already talking to a server", file=sys.stderr)
+        return 2
+    try:
+        main(argv)
+        return 0
+    except SystemExit as e:
+        if e.code is None or isinstance(e.code, int):
+            return e.code or 0
+        print(e.code, file=sys.stderr)
+        return 1
+    except Exception:
+        traceback.print_exc()
+        return 1
+    finally:
+        # a session shell would stay in this client's directory and environment
+        use_shell_session(False)
+
+
+def handle(conn: socket.socket):
+    """Serve one client connection."""
+    request, fds = _recv_request(conn)
+    with _client_context(request, fds):
+        status = _run(request["argv"])
+    conn.sendall(_STATUS.pack(status))
+
+
+def _remove_stale_socket(path: str):
+    if not os.path.exists(path):
+        return
+    if os.lstat(path).st_uid != os.getuid():
+        raise RuntimeError(f"{path} belongs to another user")
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        probe.connect(path)
+    except ConnectionRefusedError:
+        os.unlink(path)  # left behind by a server that was killed
+        return
+    finally:
+        probe.close()
+    raise RuntimeError(f"a scriptpy server is already listening on {path}")
+
+
+def serve(path: str | None = None):
+    """Listen on the Unix socket `path` (see `default_socket_path`) until interrupted."""
+    path = path or default_socket_path()
+    if os.path.dirname(path) == _private_directory():
+        check_private_directory(os.path.dirname(path), create=True)
+    _remove_stale_socket(path)
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    old_umask = os.umask(0o177)  # only the current user may connect
+    try:
+        sock.bind(path)
+    finally:
+        os.umask(old_umask)
+    sock.listen()
+    # stop on `kill` like on Ctrl-C, so the socket gets removed
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    print(f"scriptpy server listening on {path}", file=sys.stderr, flush=True)
+    try:
+        while True:
+            conn, _ = sock.accept()
+            with conn:
+                try:
+                    handle(conn)
+                except (OSError, ValueError) as e:
+                    print(f"scriptpy server: dropped a request: {e}", file=sys.stderr)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        sock.close()
+        with contextlib.suppress(FileNotFoundError):
+            os.unlink(path)
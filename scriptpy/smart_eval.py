@@ -33,6 +33,35 @@ def balance_fix(s):
         pass  # Handle unterminated tokens or other errors
     return s + "".join(reversed(stack))
 
+_CLOSERS = {"(": ")", "[": "]", "{": "}"}
+
+
+def balanced_tokens(src: str):
+    """
+    Tokenize `src` once, yielding its tokens followed by the closers of any bracket
+    left open at the end of the input, so the stream is balanced the way
+    `balance_fix` balances the text, without a separate tokenizing pass.
+    """
+    stack = []
+    try:
+        for tok in tokenize.generate_tokens(io.StringIO(src).readline):
+            if tok.type == tokenize.OP:
+                if tok.string in _CLOSERS:
+                    stack.append(_CLOSERS[tok.string])
+                elif stack and stack[-1] == tok.string:
+                    stack.pop()
+                # Else: ignore mismatched closing brackets
+            yield tok
+    except tokenize.TokenError as e:
+        # only an unclosed bracket can be fixed, not e.g. an unterminated string
+        if not stack or "string" in str(e.args[0]):
+            raise
+        for closer in reversed(stack):
+            yield tokenize.TokenInfo(tokenize.OP, closer, (0, 0), (0, 0), "")
+        yield tokenize.TokenInfo(tokenize.NEWLINE, "", (0, 0), (0, 0), "")
+        yield tokenize.TokenInfo(tokenize.ENDMARKER, "", (0, 0), (0, 0), "")
+
+
 def smart_parse(code, filename):
     """
     Parse the given code into an AST, handling SyntaxError by attempting to fix
@@ -48,31 +77,40 @@ def smart_parse(code, filename):
             raise
 
 
-def smart_run(
-    tree:ast.Module, globals_dict,
-    filename: str,
-):  # inspired by pyodide CodeRunner : https://github.com/pyodide/pyodide/blob/4fbbbedc09496c6968086d69aadba75398718b13/src/py/_pyodide/_base.py#L172
-    if globals_dict is None:
-        globals_dict = {}
-
+def smart_compile(tree: ast.Module, filename: str):
+    """
+    Compile `tree` the way `smart_run` executes it: a trailing expression is
+    compiled separately in "eval" mode so its value can be returned.
 
-    last_stmt = tree.body[-1]
+    Returns a `(body_code, expr_code)` pair; either may be `None`.
+    """
+    last_stmt = tree.body[-1] if tree.body else None
 
     if isinstance(last_stmt, ast.Expr):
+        body_code = None
         if len(tree.body) > 1:
-            exec(
-                compile(
-                    ast.Module(body=tree.body[:-1], type_ignores=[]), filename, "exec"
-                ),
-                globals_dict,
+            body_code = compile(
+                ast.Module(body=tree.body[:-1], type_ignores=[]), filename, "exec"
             )
-        return eval(
-            compile(ast.Expression(last_stmt.value), filename, "eval"), globals_dict
-        )
-    else:
-        exec(compile(tree, filename, "exec"), globals_dict)
-        return None
+        return body_code, compile(ast.Expression(last_stmt.value), filename, "eval")
+    return compile(tree, filename, "exec"), None
+
 
+def run_compiled(codes, globals_dict):
+    """Execute a `(body_code, expr_code)` pair produced by `smart_compile`."""
+    body_code, expr_code = codes
+    if body_code is not None:
+        exec(body_code, globals_dict)
+    if expr_code is not None:
+        return eval(expr_code, globals_dict)
+    return None
 
 
+def smart_run(
+    tree:ast.Module, globals_dict,
+    filename: str,
+):  # inspired by pyodide CodeRunner : https://github.com/pyodide/pyodide/blob/4fbbbedc09496c6968086d69aadba75398718b13/src/py/_pyodide/_base.py#L172
+    if globals_dict is None:
+        globals_dict = {}
 
+    return run_compiled(smart_compile(tree, filename), globals_dict)
@@ -0,0 +1,109 @@
+"""
+Instrumentation of the phases of compiling and running scriptpy code.
+"""
+import time
+from contextlib import nullcontext
+
+
+class Timings:
+    """
+    Collects the wall time of each phase of compiling and running a snippet: tokenizing,
+    the token rewrite, parsing, every AST transformer (auto-import probing happens in
+    `AutoImportTransformer`), compiling and running. Pass one to `custom_eval(...,
+    timings=Timings())` and read `phases` or print `report()`. A phase that runs more
+    than once (e.g. once per input line) is summed.
+
+    With `profile=True` the run phase is also profiled with `cProfile`, and the
+    `pstats.Stats` are kept in `stats`.
+    """
+    enabled = True
+
+    def __init__(self, profile=False):
+        self.profile = profile
+        self.phases = {}       # phase name -> seconds, in the order the phases ran
+        self.stats = None      # pstats.Stats of the run phase, with `profile`
+        self.cache_hit = None  # whether the compiled code came from a cache
+
+    def phase(self, name: str, profile=False):
+        """A context manager adding the time spent in its body to phase `name`."""
+        return _Phase(self, name, profile and self.profile)
+
+    def add(self, name: str, seconds: float):
+        self.phases[name] = self.phases.get(name, 0.0) + seconds
+
+    @property
+    def total(self) -> float:
+        return sum(self.phases.values())
+
+    def report(self) -> str:
+        """The phases as a table of milliseconds and shares of the total."""
+        total = self.total
+        width = max(map(len, self.phases), default=5)
+        lines = [
+            f"{name:<{width}}  {seconds * 1000:10.3f} ms  {seconds / total if total else 0:6.1%}"
+            for name, seconds in self.phases.items()
+        ]
+        lines.append(f"{'total':<{width}}  {total * 1000:10.3f} ms")
+        if self.cache_hit:
+            lines.append("(compiled code from cache)")
+        return "\n".join(lines)
+
+    def print_stats(self, file=None, sort="cumulative", limit=25):
+        """Print the profile of the run phase (requires `profile=True`)."""
+        if self.stats is None:
+            return
+        self.stats.stream = file
+        self.stats.sort_stats(sort).print_stats(limit)
+
+    def __repr__(self):
+        phases = ", ".join(f"{name}={seconds * 1000:.3f}ms" for name, seconds in self.phases.items())
+        return f"<Timings {phases}>"
+
+
+class _Phase:
+    __slots__ = ("timings", "name", "profiler", "start")
+
+    def __init__(self, timings: Timings, name: str, profile: bool):
+        self.timings = timings
+        self.name = name
+        self.profiler = None
+        if profile:
+            import cProfile
+
+            self.profiler = cProfile.Profile()
+
+    def __enter__(self):
+        if self.profiler is not None:
+            self.profiler.enable()
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc_info):
+        self.timings.add(self.name, time.perf_counter() - self.start)
+        if self.profiler is not None:
+            self.profiler.disable()
+            import pstats
+
+            if self.timings.stats is None:
+                self.timings.stats = pstats.Stats(self.profiler)
+            else:
+                self.timings.stats.add(self.profiler)
+
+
+class _NoTimings:
+    """Stands in for `Timings` when instrumentation is off: every phase is a no-op."""
+    enabled = False
+    _phase = nullcontext()
+
+    def phase(self, name: str, profile=False):
+        return self._phase
+
+    @property
+    def cache_hit(self):
+        return None
+
+    @cache_hit.setter
+    def cache_hit(self, value):
+        pass
+
+
+NO_TIMINGS = _NoTimings()
@@ -1,5 +1,7 @@
 import ast
+import builtins
 import importlib
+import importlib.machinery
 import importlib.util
 import sys
 from ..baseTransformer import BaseTransformer
@@ -7,18 +9,206 @@ blacklist = [
     "this", # can be confusing
 ]
 
-import ast
-import importlib
-import importlib.util
-import sys
+# Process-wide results of module probing, so each name is only looked up once:
+# (module name, sys.path) -> whether the module exists,
+# (module name, attribute, sys.path) -> whether `module.attribute` exists.
+_spec_cache: dict = {}
+_attr_cache: dict = {}
+
+
+def clear_import_cache():
+    """Forget every cached module lookup (e.g. after installing a package)."""
+    _spec_cache.clear()
+    _attr_cache.clear()
+
+
+def _module_exists(module_name: str, path_key: tuple) -> bool:
+    key = (module_name, path_key)
+    exists = _spec_cache.get(key)
+    if exists is None:
+        try:
+            exists = importlib.util.find_spec(module_name) is not None
+        except (ImportError, ValueError):
+            exists = False
+        _spec_cache[key] = exists
+    return exists
+
+
+def module_has_attr(module_name: str, attr: str, path_key: tuple | None = None, load=True) -> bool:
+    """
+    Return whether `module_name` is an importable module with an attribute `attr`.
+
+    Results are cached per `sys.path` (`path_key`). Modules imported to check the
+    attribute stay in `sys.modules`, as the inserted import loads them anyway.
+    With `load=False` modules are never imported: for a module that isn't loaded
+    yet, only its existence is checked.
+    """
+    if path_key is None:
+        path_key = tuple(sys.path)
+    key = (module_name, attr, path_key)
+    found = _attr_cache.get(key)
+    if found is None:
+        found = False
+        module = sys.modules.get(module_name)
+        if module is None and not load:
+            return _module_exists(module_name, path_key)
+        if module is None and _module_exists(module_name, path_key):
+            try:
+                module = importlib.import_module(module_name)
+            except Exception:
+                module = None
+        if module is not None:
+            found = hasattr(module, attr)
+        _attr_cache[key] = found
+    return found
+
+
+def lazy_import(name: str):
+    """
+    Return the module `name`, deferring its execution to the first attribute access
+    (via `importlib.util.LazyLoader`). Modules that aren't loaded from Python files
+    (builtins, extensions) are cheap to load and are imported right away.
+    """
+    module = sys.modules.get(name)
+    if module is not None:
+        return module
+    spec = importlib.util.find_spec(name)
+    if spec is None:
+        raise ModuleNotFoundError(f"No module named {name!r}", name=name)
+    if not isinstance(spec.loader, (importlib.machinery.SourceFileLoader, importlib.machinery.SourcelessFileLoader)):
+        return importlib.import_module(name)
+
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
+
+
+_FUNCTIONS = (ast.FunctionDef, ast.AsyncFunctionDef, ast.Lambda)
+_COMPREHENSIONS = (ast.ListComp, ast.SetComp, ast.DictComp, ast.GeneratorExp)
+
+
+def _scope_events(node: ast.AST):
+    """
+    Yield `("bind", name)` for the names `node` binds and `("attr", name)` for the names
+    it loads an attribute of (`name.attr`), and `("global", name)` for `global`/`nonlocal`
+    declarations, roughly in execution order (e.g. the value
+    of an assignment before its targets). Nested scopes are not entered, only the parts
+    of them that run in this scope (decorators, defaults, the first iterable of a
+    comprehension) and the name a function or class definition binds.
+    """
+    if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+        children = list(node.decorator_list)
+        if isinstance(node, ast.ClassDef):
+            children += node.bases + [keyword.value for keyword in node.keywords]
+        else:
+            children += node.args.defaults + [default for default in node.args.kw_defaults if default]
+        for child in children:
+            yield from _scope_events(child)
+        yield "bind", node.name
+        return
+    if isinstance(node, ast.Lambda):
+        for default in node.args.defaults + [default for default in node.args.kw_defaults if default]:
+            yield from _scope_events(default)
+        return
+    if isinstance(node, _COMPREHENSIONS):
+        yield from _scope_events(node.generators[0].iter)
+        return
+    if isinstance(node, ast.Attribute) and isinstance(node.value, ast.Name) and isinstance(node.value.ctx, ast.Load):
+        yield "attr", node.value.id
+        return
+    if isinstance(node, ast.Name):
+        if not isinstance(node.ctx, ast.Load):
+            yield "bind", node.id
+        return
+    if isinstance(node, (ast.Import, ast.ImportFrom)):
+        for alias in node.names:
+            yield "bind", alias.asname or alias.name.split(".")[0]
+        return
+    if isinstance(node, (ast.Global, ast.Nonlocal)):
+        for name in node.names:
+            yield "global", name
+        return
+
+    if isinstance(node, (ast.Assign, ast.AnnAssign, ast.AugAssign, ast.NamedExpr)):
+        children = [node.value] if node.value else []
+        children += node.targets if isinstance(node, ast.Assign) else [node.target]
+    elif isinstance(node, (ast.For, ast.AsyncFor)):
+        children = [node.iter, node.target, *node.body, *node.orelse]
+    elif isinstance(node, (ast.With, ast.AsyncWith)):
+        children = [part for item in node.items for part in (item.context_expr, item.optional_vars) if part]
+        children += node.body
+    else:
+        children = ast.iter_child_nodes(node)
+    for child in children:
+        yield from _scope_events(child)
+    if isinstance(node, ast.ExceptHandler) and node.name:
+        yield "bind", node.name
+    # match statement captures (Python 3.10+)
+    elif type(node).__name__ in ("MatchAs", "MatchStar") and node.name:
+        yield "bind", node.name
+    elif type(node).__name__ == "MatchMapping" and node.rest:
+        yield "bind", node.rest
+
+
+def bound_names(scope: ast.AST) -> set:
+    """
+    Collect the names the code of `scope` (a module, function, lambda, class or
+    comprehension) binds in that scope: assignment, loop, comprehension and
+    `with`/`except` targets, parameters, function and class names, and imports. Such
+    names are variables, not modules to auto-import. Bindings in nested scopes don't
+    count, and neither does a name whose first use in the scope loads an attribute of
+    it (`time = time.time()`): that one refers to a module until it is rebound.
+    """
+    events = []
+    if isinstance(scope, _FUNCTIONS):
+        arguments = scope.args
+        parameters = arguments.posonlyargs + arguments.args + arguments.kwonlyargs
+        parameters += [arg for arg in (arguments.vararg, arguments.kwarg) if arg]
+        events += [("bind", arg.arg) for arg in parameters]
+        body = scope.body if isinstance(scope.body, list) else [scope.body]
+    elif isinstance(scope, _COMPREHENSIONS):
+        for index, generator in enumerate(scope.generators):
+            if index:
+                events += _scope_events(generator.iter)
+            events += _scope_events(generator.target)
+            for condition in generator.ifs:
+                events += _scope_events(condition)
+        body = [scope.key, scope.value] if isinstance(scope, ast.DictComp) else [scope.elt]
+    else:
+        body = scope.body
+    for node in body:
+        events += _scope_events(node)
+
+    first_use = {}
+    for kind, name in events:
+        first_use.setdefault(name, kind)
+    return {name for name, kind in first_use.items() if kind == "bind"}
+
 
 class AutoImportTransformer(BaseTransformer):
-    """Detects qualified module usage and inserts missing imports."""
+    """
+    Detects qualified module usage and inserts missing imports.
+    With the `lazy_imports` option, detected modules are bound to lazily loaded
+    modules (`json = _lazy_import('json')`) instead of being imported up front.
 
-    def __init__(self):
-        super().__init__()
+    Only free names are probed: names bound by the snippet itself, builtins and the
+    `known_names` option (the keys of the globals the snippet will run with) are skipped.
+    """
+    environment = {
+        "_lazy_import": lazy_import,
+    }
+
+    def __init__(self, **options):
+        super().__init__(**options)
+        self.lazy_imports = options.get("lazy_imports", False)
         self.detected_modules = set()
         self.existing_imports = set()
+        self._path_key = tuple(sys.path)
+        self.bound_names = set(options.get("known_names", ())) | set(vars(builtins))
+        self._local_names = []  # (whether it is a class, names bound) of each enclosing nested scope
 
     def visit_Import(self, node: ast.Import):
         """Track existing imports."""
@@ -31,33 +221,53 @@ class AutoImportTransformer(BaseTransformer):
         """Detect module.attr patterns."""
         if isinstance(node.value, ast.Name):
             module_name = node.value.id
-            attr = node.attr
-            spec = importlib.util.find_spec(module_name)
-            if spec:
-                was_loaded = module_name in sys.modules
-                try:
-                    mod = importlib.import_module(module_name)
-                    if hasattr(mod, attr):
-                        self.detected_modules.add(module_name)
-                except Exception:
-                    pass
-                finally:
-                    if not was_loaded and module_name in sys.modules:
-                        del sys.modules[module_name]
+            if (
+                module_name not in self.detected_modules and module_name not in self.bound_names
+                and not self._is_local(module_name)
+                and module_has_attr(module_name, node.attr, self._path_key, load=not self.lazy_imports)
+            ):
+                self.detected_modules.add(module_name)
 
         return self.generic_visit(node)
 
+    def _is_local(self, name: str) -> bool:
+        """Whether `name` is bound by the current nested scope or one it can see."""
+        scopes = self._local_names
+        if scopes and name in scopes[-1][1]:
+            return True
+        # like in Python, the names of a class body aren't visible in its methods
+        return any(name in names for is_class, names in scopes[:-1] if not is_class)
+
+    def _visit_scope(self, node):
+        """Visit a nested scope, with the names it binds counted as bound inside it."""
+        self._local_names.append((isinstance(node, ast.ClassDef), bound_names(node)))
+        self.generic_visit(node)
+        self._local_names.pop()
+        return node
+
+    visit_FunctionDef = visit_AsyncFunctionDef = visit_Lambda = visit_ClassDef = _visit_scope
+    visit_ListComp = visit_SetComp = visit_DictComp = visit_GeneratorExp = _visit_scope
+
     def visit_Module(self, node: ast.Module):
         """Insert missing imports."""
+        self.bound_names |= bound_names(node)
         self.generic_visit(node)
         new_imports = [
-            ast.Import(names=[ast.alias(name=mod, asname=None)])
+            self._lazy_import_stmt(mod) if self.lazy_imports else ast.Import(names=[ast.alias(name=mod, asname=None)])
             for mod in sorted(self.detected_modules)
             if mod not in self.existing_imports
         ]
         node.body = new_imports + node.body
         return node
 
+    @staticmethod
+    def _lazy_import_stmt(mod: str) -> ast.Assign:
+        """`mod = _lazy_import('mod')`"""
+        return ast.Assign(
+            targets=[ast.Name(id=mod, ctx=ast.Store())],
+            value=ast.Call(func=ast.Name(id="_lazy_import", ctx=ast.Load()), args=[ast.Constant(value=mod)], keywords=[]),
+        )
+
 def detect_and_add_imports(code: str) -> str:
     """Detects module usage and adds missing imports."""
     try:
@@ -1,11 +1,156 @@
-import tokenize,token
+import token
 from ..baseTransformer import BaseTransformer
-import ast
-import subprocess
-from io import StringIO
+import atexit
+import os
+import re
+import threading
+import time
 
-def shell_exec_base(cmd,check=True):
-    return subprocess.run(cmd, shell=True, check=check, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+from .pipes import PipeableIter, PipeableList
+
+# `subprocess` (and the modules only the shell helpers use) is imported by the helpers
+# themselves, so snippets without shell commands don't load it.
+
+
+class ShellSession:
+    """
+    A long-lived `/bin/sh` that runs commands one after the other, so a `$(...)` costs a
+    round-trip over pipes instead of starting a new shell.
+
+    Each command runs as `eval '<cmd>' </dev/null` and is followed by marker lines on
+    stdout (carrying the exit status) and on stderr, which delimit its output. Shell
+    state (working directory, variables) is shared between commands. When a command
+    ends the shell (`exit`, a syntax error), its status is reported and the next command
+    starts a new shell.
+    """
+
+    def __init__(self, shell="/bin/sh"):
+        self.shell = shell
+        self._process = None
+        self._lock = threading.Lock()
+        self._marker = f"__scriptpy_{os.urandom(8).hex()}__"
+        self._stdout_end = re.compile(rb"\n" + self._marker.encode() + rb" (\d+)\n\Z")
+        self._stderr_end = f"\n{self._marker}\n".encode()
+
+    def _start(self):
+        import subprocess
+
+        if self._process is None or self._process.poll() is not None:
+            # own process group, so a timeout or interrupt can kill the running command too
+            self._process = subprocess.Popen(
+                [self.shell], stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                bufsize=0, start_new_session=True,
+            )
+        return self._process
+
+    def close(self):
+        """Kill the shell (and whatever it is running); the next command starts a new one."""
+        process, self._process = self._process, None
+        if process is None:
+            return
+        if process.poll() is None:
+            import signal
+
+            try:
+                os.killpg(process.pid, signal.SIGKILL)
+            except OSError:
+                pass
+        process.wait()
+        for stream in (process.stdin, process.stdout, process.stderr):
+            stream.close()
+
+    def run(self, cmd, check=True, timeout=None) -> "subprocess.CompletedProcess":
+        """Run `cmd` in the session, like `subprocess.run(cmd, shell=True, text=True, ...)`."""
+        import locale
+        import shlex
+        import subprocess
+
+        script = (
+            f"{{ eval {shlex.quote(cmd)}\n}} </dev/null\n"
+            f"printf '\\n%s %d\\n' {self._marker} $?\n"
+            f"printf '\\n%s\\n' {self._marker} >&2\n"
+        )
+        with self._lock:
+            process = self._start()
+            try:
+                process.stdin.write(script.encode())
+                stdout, stderr, returncode = self._read(process, cmd, timeout)
+            except BaseException:
+                # the shell is in the middle of a command, don't reuse it
+                self.close()
+                raise
+        encoding = locale.getpreferredencoding(False)
+        result = subprocess.CompletedProcess(cmd, returncode, stdout.decode(encoding), stderr.decode(encoding))
+        if check:
+            result.check_returncode()
+        return result
+
+    def _read(self, process, cmd, timeout):
+        import selectors
+        import subprocess
+
+        deadline = None if timeout is None else time.monotonic() + timeout
+        stdout, stderr = bytearray(), bytearray()
+        returncode = None
+        with selectors.DefaultSelector() as selector:
+            selector.register(process.stdout, selectors.EVENT_READ, stdout)
+            selector.register(process.stderr, selectors.EVENT_READ, stderr)
+            while selector.get_map():
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    raise subprocess.TimeoutExpired(cmd, timeout, bytes(stdout), bytes(stderr))
+                for key, _ in selector.select(remaining):
+                    chunk = os.read(key.fd, 65536)
+                    if not chunk:  # the shell exited
+                        selector.unregister(key.fileobj)
+                        continue
+                    buffer = key.data
+                    buffer += chunk
+                    if buffer is stdout:
+                        match = self._stdout_end.search(buffer, max(len(buffer) - len(self._marker) - 32, 0))
+                        if match:
+                            returncode = int(match[1])
+                            del buffer[match.start():]
+                            selector.unregister(key.fileobj)
+                    elif buffer.endswith(self._stderr_end):
+                        del buffer[-len(self._stderr_end):]
+                        selector.unregister(key.fileobj)
+        if returncode is None:  # the command ended the shell before reporting
+            returncode = process.wait()
+            self.close()
+        return bytes(stdout), bytes(stderr), returncode
+
+
+_session = None
+
+
+def use_shell_session(enabled=True):
+    """
+    Route `$(...)` commands through one persistent `ShellSession` (or back to a new
+    shell per command with `enabled=False`). Returns the active session, if any.
+    """
+    global _session
+    if enabled and _session is None:
+        _session = ShellSession()
+        atexit.register(_session.close)
+    elif not enabled and _session is not None:
+        atexit.unregister(_session.close)
+        _session.close()
+        _session = None
+    return _session
+
+
+def _run_process(cmd, check=True, timeout=None):
+    import subprocess
+
+    return subprocess.run(cmd, shell=True, check=check, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True,
+                          timeout=timeout)
+
+
+def shell_exec_base(cmd,check=True,timeout=None):
+    if _session is not None:
+        return _session.run(cmd, check=check, timeout=timeout)
+    return _run_process(cmd, check=check, timeout=timeout)
 
 def shell_exec(cmd):
     return shell_exec_base(cmd,check=True).stdout.strip()
@@ -15,6 +160,186 @@ def shell_exec_multi(cmd):
     return res.stdout.strip(), res.stderr.strip(), res.returncode
 
 
+class ShellBatch:
+    """
+    Runs many shell commands concurrently on a bounded worker pool and returns their
+    outputs (stripped stdout, like `$(...)`) in input order. Available in snippets as
+    `$[commands]` / `$[cmd1, cmd2]`, or called as `_shell_exec_many(commands, limit=, timeout=)`.
+
+    `limit` is the maximum number of commands running at once, `timeout` the time
+    (in seconds) each command may take. The first failing command (in input order)
+    raises its `CalledProcessError` / `TimeoutExpired`.
+    """
+
+    def __init__(self, limit=16, timeout=None):
+        self.limit = limit
+        self.timeout = timeout
+
+    def __call__(self, cmds, limit=None, timeout=None):
+        import concurrent.futures
+
+        cmds = [cmds] if isinstance(cmds, str) else list(cmds)
+        limit = limit or self.limit
+        timeout = timeout if timeout is not None else self.timeout
+        if not cmds:
+            return PipeableList()
+        with concurrent.futures.ThreadPoolExecutor(max_workers=min(limit, len(cmds))) as pool:
+            # one process per command even with a shell session, which would run them one at a time
+            results = list(pool.map(lambda cmd: _run_process(cmd, check=True, timeout=timeout), cmds))
+        return PipeableList(res.stdout.strip() for res in results)
+
+    def __getitem__(self, cmds):
+        # `$[a, b]` passes a tuple, `$[commands]` the iterable itself
+        return self(cmds)
+
+
+shell_exec_many = ShellBatch()
+
+
+def shell_exec_bytes(*cmds, input=None):
+    """
+    Run `cmds` as a pipeline and return the raw stdout of the last command as `bytes`
+    (not decoded or stripped). Each command's stdout is connected straight to the next
+    command's stdin, so the data never passes through Python.
+
+    `input` is fed to the first command: `bytes`-like data, or a file object with a file
+    descriptor, which is handed to the process as-is. stderr is not captured.
+    A failing command raises `CalledProcessError` (a command killed by SIGPIPE because
+    a later one stopped reading is not an error, like in a shell pipeline).
+    """
+    import signal
+    import subprocess
+
+    if not cmds:
+        raise TypeError("shell_exec_bytes() needs at least one command")
+    feed = None
+    if input is None or hasattr(input, "fileno"):
+        stdin = input
+    else:
+        stdin, feed = subprocess.PIPE, memoryview(input)
+
+    processes = []
+    writer = None
+    try:
+        for cmd in cmds:
+            process = subprocess.Popen(cmd, shell=True, stdin=stdin, stdout=subprocess.PIPE)
+            if processes:
+                processes[-1].stdout.close()  # the new process owns the read end now
+            processes.append(process)
+            stdin = process.stdout
+        if feed is not None:
+            writer = threading.Thread(target=_feed, args=(processes[0].stdin, feed), daemon=True)
+            writer.start()
+        output = processes[-1].stdout.read()
+    except BaseException:
+        for process in processes:
+            process.kill()
+        raise
+    finally:
+        if processes:  # empty when the first command couldn't be started
+            processes[-1].stdout.close()
+        for process in processes:
+            process.wait()
+        if writer is not None:
+            writer.join()
+
+    last = processes[-1]
+    for cmd, process in zip(cmds, processes):
+        # `sh -c` reports a command killed by a signal as 128 + signal number
+        if process.returncode and (process is last or process.returncode not in (-signal.SIGPIPE, 128 + signal.SIGPIPE)):
+            raise subprocess.CalledProcessError(process.returncode, cmd, output if process is last else None)
+    return output
+
+
+def _feed(stream, data):
+    try:
+        stream.write(data)
+    except BrokenPipeError:  # the command exited without reading all its input
+        pass
+    finally:
+        try:
+            stream.close()
+        except BrokenPipeError:
+            pass
+
+
+def _stream_lines(cmd):
+    import subprocess
+
+    process = subprocess.Popen(cmd, shell=True, stdout=subprocess.PIPE, text=True)
+    finished = False
+    try:
+        for line in process.stdout:
+            yield line[:-1] if line.endswith("\n") else line
+        finished = True
+    finally:
+        process.stdout.close()
+        if not finished:  # the consumer stopped early, don't wait for the command to end
+            process.kill()
+        returncode = process.wait()
+    if returncode:
+        raise subprocess.CalledProcessError(returncode, cmd)
+
+
+def shell_stream(cmd):
+    """
+    Run `cmd` and lazily yield its stdout lines (without the newline) as they arrive.
+    The command starts on first iteration; a non-zero exit status raises
+    `CalledProcessError` once the output is exhausted. stderr is not captured.
+    """
+    return PipeableIter(_stream_lines(cmd))
+
+
+def rewrite_shell(editor) -> bool:
+    """
+    Rewrite `$(` into `_shell_exec(` (or `_shell_exec_multi(` for multi-assignments),
+    `$<(` into `_shell_stream(`, `$b(` into `_shell_exec_bytes(` and `$[` into `_shell_exec_many[`.
+    The command and its closing ")" stream through unchanged.
+    """
+    lp = editor.peek(1)
+    if lp and lp.type == token.NAME and lp.string == "b":
+        lp2 = editor.peek(2)
+        if lp2 and lp2.type == token.OP and lp2.string == "(":
+            editor.skip(3)
+            editor.append(type=token.NAME, string="_shell_exec_bytes")
+            editor.append(type=token.OP, string="(")
+            return True
+        return False
+    if lp and lp.type == token.OP and lp.string == "[":
+        editor.skip(1)
+        editor.append(type=token.NAME, string="_shell_exec_many")
+        return True
+    if lp and lp.type == token.OP and lp.string == "<":
+        lp2 = editor.peek(2)
+        if lp2 and lp2.type == token.OP and lp2.string == "(":
+            editor.skip(3)
+            editor.append(type=token.NAME, string="_shell_stream")
+            editor.append(type=token.OP, string="(")
+            return True
+        return False
+    if not (lp and lp.type == token.OP and lp.string == "("):
+        return False
+
+    # Heuristic for multi-assignment: a "=" and a "," earlier in the same logical line.
+    # The source tokens are checked, not the output, in which other rewrites may have
+    # emitted commas (e.g. `|.name(` → `_mpipe('name' ,`).
+    found_eq = found_comma = False
+    for t in reversed(editor.get_input_history(20)):
+        if t.type == token.NEWLINE:
+            break
+        if t.type == token.OP:
+            found_eq = found_eq or t.string == "="
+            found_comma = found_comma or t.string == ","
+    is_multi = found_eq and found_comma
+
+    # Replace the "$" and "(" with the shell-exec call
+    editor.skip(2)
+    editor.append(type=token.NAME,
+                  string="_shell_exec_multi" if is_multi else "_shell_exec")
+    editor.append(type=token.OP, string="(")
+    return True
+
+
 class ShellTransformer(BaseTransformer):
     """
     A transformer that run shell commands on $(command) syntax. inspired by zx.
@@ -27,69 +352,31 @@ class ShellTransformer(BaseTransformer):
     # and
     stdout,stderr,return_code = $(curl -s https://example.com | jq '.data[] | .name')
     ```
+
+    `$<(command)` streams the output instead, as a lazy pipe of lines:
+
+    ```python
+    $<("find / -name '*.log'") |.upper()
+    ```
+
+    `$b(command, ...)` returns the raw output bytes, piping several commands into each other:
+
+    ```python
+    digest = hashlib.sha256($b("tar c src", "gzip -n")).hexdigest()
+    ```
+
+    and `$[commands]` runs a list of commands concurrently:
+
+    ```python
+    uptimes = $[hosts | (lambda h: f"ssh {h} uptime")]
+    ```
     """
     environment = {
         "_shell_exec": shell_exec,
         "_shell_exec_multi": shell_exec_multi,
+        "_shell_stream": shell_stream,
+        "_shell_exec_many": shell_exec_many,
+        "_shell_exec_bytes": shell_exec_bytes,
     }
-    @staticmethod
-    def token_level_transform(editor):
-        while editor.has_more():
-            current = editor.current
-            assert current  # for typing
-
-            # Look for the $(
-            if current.type == token.OP and current.string == "$":
-                lp = editor.peek(1)
-                if lp and lp.type == token.OP and lp.string == "(":
-                    # Heuristic for multi-assignment:
-                    history = editor.get_output_history(20)
-                    found_eq = any(t.type == token.OP and t.string == "=" for t in history)
-                    found_comma = False
-                    if found_eq:
-                        for t in reversed(history):
-                            if t.type == token.NEWLINE:
-                                break
-                            if t.type == token.OP and t.string == ",":
-                                found_comma = True
-                                break
-                    is_multi = found_eq and found_comma
-
-                    # Skip the "$" and "("
-                    editor.skip(2)
-
-                    # Collect everything up to the matching ")"
-                    depth = 1
-                    collected = []
-                    while editor.has_more():
-                        t = editor.current
-                        assert t  # for typing
-
-                        if t.type == token.OP:
-                            if t.string == "(":
-                                depth += 1
-                            elif t.string == ")":
-                                depth -= 1
-                                # consume the closing ")"
-                                editor.skip(1)
-                                break
-                        collected.append(t)
-                        editor.skip(1)
-
-                    # Emit the shell-exec call
-                    editor.append(type=token.NAME,
-                                  string="_shell_exec_multi" if is_multi else "_shell_exec")
-                    editor.append(type=token.OP, string="(")
-                    # replay the collected tokens inside the call
-                    for tok in collected:
-                        editor.append(type=tok.type, string=tok.string)
-                    editor.append(type=token.OP, string=")")
-
-                    continue
-
-            # Fallback: copy token through unchanged
-            editor.append_current()
-
-
-
-
+    # "$" is an OP token on Python 3.12+ and an ERRORTOKEN before, so match on the string only
+    token_patterns = {"$": rewrite_shell}
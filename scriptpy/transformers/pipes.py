@@ -1,4 +1,4 @@
-import ast, io, tokenize, token
+import ast, sys, threading, time, token
 from collections.abc import Iterable
 
 
@@ -9,13 +9,53 @@ from ..baseTransformer import BaseTransformer
 
 class PipeableList(list):
     def __or__(self, fn):
+        if isinstance(fn, ParallelStage):
+            return PipeableList(fn.map(self))
         if callable(fn):
             return PipeableList(map(fn, self))
         raise TypeError("Right-hand side must be callable")
 
 
+class PipeableIter:
+    """
+    A lazy pipe: every `| fn` stage is chained as a generator, so nothing is
+    computed (or held in memory) until the pipe is iterated.
+    Results returned from a snippet are materialized into a `PipeableList`.
+    """
+    __slots__ = ("_iterable",)
+
+    def __init__(self, iterable):
+        self._iterable = iterable
+
+    def __iter__(self):
+        return iter(self._iterable)
+
+    def __or__(self, fn):
+        if isinstance(fn, ParallelStage):
+            return PipeableIter(fn.map(self._iterable))
+        if callable(fn):
+            return PipeableIter(map(fn, self._iterable))
+        raise TypeError("Right-hand side must be callable")
+
+    def __repr__(self):
+        return f"<PipeableIter over {self._iterable!r}>"
+
+
 def left_pipe(obj):
-    if isinstance(obj, Iterable) and not isinstance(obj, (str, PipeableList)):
+    if isinstance(obj, Iterable) and not isinstance(obj, (str, PipeableList, PipeableIter)):
+        return PipeableList(obj)
+    return obj
+
+
+def lazy_left_pipe(obj):
+    if isinstance(obj, Iterable) and not isinstance(obj, (str, PipeableIter)):
+        return PipeableIter(obj)
+    return obj
+
+
+def materialize(obj):
+    """Turn a lazy pipe result into a `PipeableList`; anything else is returned as is."""
+    if isinstance(obj, PipeableIter):
         return PipeableList(obj)
     return obj
 
@@ -29,111 +69,391 @@ def _attr_pipe(name, *args):
             return attr(*args)
         return attr
 
+    attr_pipe.pipe_attr = (name, args)  # lets array pipes apply it to a whole array
     return attr_pipe
 
 
+def _attr_call(attr, *args):
+    """`attr(*args)` if `attr` is callable, else `attr` (what `|.name` does to each element)."""
+    if callable(attr):
+        return attr(*args)
+    return attr
+
+
+# ——— parallel stages ——————————————————————————————————————————————————
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def _get_pool(processes: bool, workers):
+    """Return the shared executor for `(processes, workers)`, creating it on first use."""
+    key = (processes, workers)
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            import concurrent.futures
+            executor = concurrent.futures.ProcessPoolExecutor if processes else concurrent.futures.ThreadPoolExecutor
+            pool = _pools[key] = executor(max_workers=workers)
+        return pool
+
+
+def shutdown_pools(wait=True):
+    """Shut down the executors created by `par(...)` stages; new ones are created on demand."""
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.shutdown(wait=wait)
+
+
+class ParallelStage:
+    """
+    A pipe stage that maps `fn` over the elements on a pool, keeping their order.
+    Available in snippets as `par`:
+
+        urls | par(fetch, workers=16)          # threads, for I/O-bound functions
+        files | par(hash_file, processes=True) # processes, for CPU-bound (picklable) functions
+
+    Pools are shared by all stages with the same `(processes, workers)` and reused
+    across evaluations. `chunksize` is passed to `Executor.map` (used by process pools).
+    """
+
+    def __init__(self, fn, workers=None, chunksize=1, processes=False):
+        if not callable(fn):
+            raise TypeError("par() needs a callable")
+        self.fn = fn
+        self.workers = workers
+        self.chunksize = chunksize
+        self.processes = processes
+
+    def __call__(self, x):
+        return self.fn(x)
+
+    def map(self, iterable):
+        return _get_pool(self.processes, self.workers).map(self.fn, iterable, chunksize=self.chunksize)
+
+    def __repr__(self):
+        kind = "processes" if self.processes else "threads"
+        return f"par({self.fn!r}, workers={self.workers}, {kind})"
+
+
+def _check_stages(stages):
+    """Raise for non-callable stages; return True if any stage is a `par(...)` stage."""
+    parallel = False
+    for stage in stages:
+        if not callable(stage):
+            raise TypeError("Right-hand side must be callable")
+        if isinstance(stage, ParallelStage):
+            parallel = True
+    return parallel
+
+
+def _pipe_stages(obj, stages, pipe=left_pipe):
+    """Apply `obj | stage` one stage at a time, like unfused pipes."""
+    for stage in stages:
+        obj = pipe(obj) | stage
+    return obj
+
+
+# ——— NumPy arrays ——————————————————————————————————————————————————————
+
+# attributes that work element by element, so `array |.name(...)` can use the array's own
+_ELEMENTWISE_ATTRS = frozenset({"real", "imag", "conj", "conjugate", "round", "astype", "clip"})
+
+
+def _array_stage(np, array, stage):
+    """`stage` applied to the whole `array` in one vectorized call, or NotImplemented."""
+    if isinstance(stage, np.ufunc):
+        if stage.nin == 1 and stage.nout == 1:
+            return stage(array)
+    elif isinstance(stage, np.vectorize):
+        return stage(array)
+    else:
+        attr = getattr(stage, "pipe_attr", None)
+        # on an n-D array the elements are rows, which e.g. `.T` treats differently
+        if attr is not None and attr[0] in _ELEMENTWISE_ATTRS and array.ndim == 1:
+            result = _attr_call(getattr(array, attr[0]), *attr[1])
+            if isinstance(result, np.ndarray) and result.shape == array.shape:
+                return result
+    return NotImplemented
+
+
+def _array_pipe(obj, stages, pipe):
+    """
+    Fast path for NumPy arrays: leading stages that are single-argument ufuncs,
+    `np.vectorize` functions or element-wise `|.name(...)` stages are applied to the whole
+    array, the rest element by element. Returns NotImplemented (use the regular path)
+    when `obj` is not an array or the first stage can't be vectorized.
+    NumPy is never imported here: arrays only exist once the snippet imported it.
+    """
+    np = sys.modules.get("numpy")
+    if np is None or not isinstance(obj, np.ndarray) or obj.ndim == 0:
+        return NotImplemented
+    for index, stage in enumerate(stages):
+        result = _array_stage(np, obj, stage)
+        if result is NotImplemented:
+            break
+        obj = result
+    else:
+        return obj
+    if index == 0:
+        return NotImplemented
+    return _pipe_stages(obj, stages[index:], pipe)
+
+
+def fused_pipe(obj, stages, make_fused, labels=()):
+    """
+    Evaluate the pipe chain `obj | stages[0] | stages[1] ...` in a single pass.
+
+    `make_fused(*stages)` returns a function applying every stage to one element,
+    so list pipes need no intermediate list per stage. Operands that are not pipeable
+    (e.g. the ints of `1 | 2`) fall back to applying `|` stage by stage.
+    `labels` (the source of the operand and of each stage) is only used by `PipeTrace`.
+    NumPy arrays go through `_array_pipe` first.
+    """
+    result = _array_pipe(obj, stages, left_pipe)
+    if result is not NotImplemented:
+        return result
+    obj = left_pipe(obj)
+    if isinstance(obj, PipeableList):
+        if _check_stages(stages):
+            return _pipe_stages(obj, stages)  # par() stages need the elements in bulk
+        return PipeableList(map(make_fused(*stages), obj))
+    if isinstance(obj, PipeableIter):
+        if _check_stages(stages):
+            return _pipe_stages(obj, stages)
+        return PipeableIter(map(make_fused(*stages), obj))
+    return _pipe_stages(obj, stages)
+
+
+def lazy_fused_pipe(obj, stages, make_fused, labels=()):
+    """`fused_pipe` for lazy mode: list pipes become a single lazy `map`."""
+    result = _array_pipe(obj, stages, lazy_left_pipe)
+    if result is not NotImplemented:
+        return result
+    obj = lazy_left_pipe(obj)
+    if isinstance(obj, PipeableIter):
+        if _check_stages(stages):
+            return _pipe_stages(obj, stages, pipe=lazy_left_pipe)
+        return PipeableIter(map(make_fused(*stages), obj))
+    return _pipe_stages(obj, stages, pipe=lazy_left_pipe)
+
+
+# ——— tracing ——————————————————————————————————————————————————————————
+
+
+class _StageStats:
+    __slots__ = ("calls", "elements", "seconds", "peak_bytes")
+
+    def __init__(self):
+        self.calls = self.elements = self.peak_bytes = 0
+        self.seconds = 0.0
+
+
+class PipeTrace:
+    """
+    Per-stage statistics of the pipe chains of a snippet: how many elements went through
+    each stage, the total and mean time per element, and the peak size of the list the
+    stage produced (shallow: the list and its elements). Enable it with
+    `custom_eval(..., trace_pipes=True)` or `--trace-pipes`, which print `report()`.
+
+    While tracing, chains run stage by stage with an intermediate list per stage (even
+    lazy ones), instead of one fused pass, so that each stage can be measured.
+    """
+
+    def __init__(self):
+        self.chains = {}  # labels of a chain -> [_StageStats per stage]
+
+    def environment(self) -> dict:
+        """The snippet helpers that route pipe chains through this trace."""
+        return {"_fpipe": self.fused_pipe}
+
+    def fused_pipe(self, obj, stages, make_fused, labels=()):
+        obj = left_pipe(obj)
+        if not isinstance(obj, (PipeableList, PipeableIter)):
+            return _pipe_stages(obj, stages)
+        _check_stages(stages)
+        if len(labels) != len(stages) + 1:
+            labels = ("<pipe>", *(f"stage {i}" for i in range(len(stages))))
+        chain = self.chains.get(labels)
+        if chain is None:
+            chain = self.chains[labels] = [_StageStats() for _ in stages]
+
+        items = list(obj)
+        for stage, stats in zip(stages, chain):
+            start = time.perf_counter()
+            if isinstance(stage, ParallelStage):
+                result = list(stage.map(items))
+            else:
+                result = [stage(item) for item in items]
+            stats.seconds += time.perf_counter() - start
+            stats.calls += 1
+            stats.elements += len(items)
+            size = sys.getsizeof(result) + sum(map(sys.getsizeof, result))
+            stats.peak_bytes = max(stats.peak_bytes, size)
+            items = result
+        return PipeableList(items)
+
+    def report(self) -> str:
+        """A table of the stages of every traced chain."""
+        lines = []
+        for labels, chain in self.chains.items():
+            width = max(max(map(len, labels[1:])), 5)
+            lines.append(f"pipe: {' | '.join(labels)}")
+            lines.append(f"  {'stage':<{width}}  {'calls':>6}  {'elements':>10}  {'total ms':>10}"
+                         f"  {'mean us':>9}  {'peak KiB':>9}")
+            for label, stats in zip(labels[1:], chain):
+                mean = stats.seconds / stats.elements * 1e6 if stats.elements else 0.0
+                lines.append(f"  {label:<{width}}  {stats.calls:>6}  {stats.elements:>10}"
+                             f"  {stats.seconds * 1000:>10.3f}  {mean:>9.3f}  {stats.peak_bytes / 1024:>9.1f}")
+        return "\n".join(lines) if lines else "(no pipes were traced)"
+
+
+# ——— token rewrite of “|.method” ——————————————————————————————————————
+
+
+def rewrite_attr_pipe(editor) -> bool:
+    """
+    Rewrite the pattern 'left |.attr' into 'left | _apipe('attr')',
+    and 'left |.attr(...)' into 'left | _mpipe('attr', ...)'.
+
+    `_mpipe` behaves like `_apipe`, the distinct name only tells `PipeTransformer`
+    that the attribute is explicitly called. The argument list streams through
+    unchanged: its "(" is replaced by a "," so its closing ")" also closes the call.
+    """
+    # Check for the specific pattern: '| . NAME'
+    dot_token = editor.peek(1)
+    name_token = editor.peek(2)
+    if not (
+        dot_token and dot_token.type == token.OP and dot_token.string == "." and
+        name_token and name_token.type == token.NAME
+    ):
+        return False
+
+    # Now, check for an optional argument list in parentheses: '( ... )'
+    arg_start = editor.peek(3)
+    is_call = bool(arg_start and arg_start.type == token.OP and arg_start.string == "(")
+
+    editor.skip(4 if is_call else 3)
+    editor.append(type=token.OP, string="|")
+    editor.append(type=token.NAME, string="_mpipe" if is_call else "_apipe")
+    editor.append(type=token.OP, string="(")
+    editor.append(type=token.STRING, string=repr(name_token.string)) # 'name' as a string literal
+    editor.append(type=token.OP, string="," if is_call else ")")
+    return True
+
+
 # ——— AST transform for plain “| func” and “|.method” ——————————————————
 
 
 class PipeTransformer(BaseTransformer):
+    """
+    Compiles pipe chains. A whole chain `a | f |.name(1) | g` becomes a single call
+
+        _fpipe(a, (f, _mpipe('name', 1), g),
+               lambda _s0, _s1, _s2: lambda _x: _s2(_s0(_x).name(1)),
+               ('a', 'f', '.name(1)', 'g'))
+
+    whose stage values are evaluated once, and whose inner lambda applies every
+    stage to one element: `|.name(...)` stages with constant arguments become
+    direct method calls (`|.name` becomes `_acall(x.name)`), so there is no `map`,
+    intermediate list or `getattr` per stage. With the `trace_pipes` compile option,
+    a last argument, the source of each part of the chain, labels the stages for
+    `PipeTrace`.
+    """
     environment =  {
             "_lpipe": left_pipe,
             "_apipe": _attr_pipe,
+            "_mpipe": _attr_pipe,
+            "_acall": _attr_call,
+            "_fpipe": fused_pipe,
+            "par": ParallelStage,
         }
+    lazy_environment = {
+            "_lpipe": lazy_left_pipe,
+            "_fpipe": lazy_fused_pipe,
+        }
+    token_patterns = {"|": rewrite_attr_pipe}
+
+    def __init__(self, **options):
+        super().__init__(**options)
+        self.trace_pipes = options.get("trace_pipes", False)
 
     def visit_BinOp(self, node):
-        self.generic_visit(node)
         if not isinstance(node.op, ast.BitOr):
-            return node
-
-        # plain func-pipe:   expr | fn   →   _lpipe(expr) | (fn)
-        return ast.BinOp(
-            left=ast.Call(
-                func=ast.Name(id="_lpipe", ctx=ast.Load()),
-                args=[node.left],
-                keywords=[],
-            ),
-            op=ast.BitOr(),
-            right=node.right,
+            return self.generic_visit(node)
+
+        # flatten the left-nested chain  ((a | f) | g) | h  →  a, [f, g, h]
+        stages = []
+        while isinstance(node, ast.BinOp) and isinstance(node.op, ast.BitOr):
+            stages.append(node.right)
+            node = node.left
+        stages.reverse()
+        labels = [self._label(node)] + [self._label(stage) for stage in stages] if self.trace_pipes else None
+        source = self.visit(node)
+        stages = [self.visit(stage) for stage in stages]
+
+        # the fused function: apply each stage to the result of the previous one
+        body = ast.Name(id="_x", ctx=ast.Load())
+        for i, stage in enumerate(stages):
+            attr = self._attr_stage(stage)
+            if attr is None:
+                body = ast.Call(func=ast.Name(id=f"_s{i}", ctx=ast.Load()), args=[body], keywords=[])
+                continue
+            name, args, is_call = attr
+            method = ast.Attribute(value=body, attr=name, ctx=ast.Load())
+            if is_call:
+                body = ast.Call(func=method, args=args, keywords=[])
+            else:
+                # `|.name` may be a plain attribute: call it only if it is callable
+                body = ast.Call(func=ast.Name(id="_acall", ctx=ast.Load()), args=[method], keywords=[])
+
+        make_fused = ast.Lambda(
+            args=self._lambda_args([f"_s{i}" for i in range(len(stages))]),
+            body=ast.Lambda(args=self._lambda_args(["_x"]), body=body),
         )
+        args = [source, ast.Tuple(elts=stages, ctx=ast.Load()), make_fused]
+        if labels is not None:
+            args.append(ast.Tuple(elts=[ast.Constant(value=label) for label in labels], ctx=ast.Load()))
+        return ast.Call(func=ast.Name(id="_fpipe", ctx=ast.Load()), args=args, keywords=[])
 
     @staticmethod
-    def token_level_transform(editor):
+    def _label(node) -> str:
+        """The source of a pipe operand or stage, with `_apipe`/`_mpipe` shown as `.name(...)`."""
+        if (
+            isinstance(node, ast.Call) and isinstance(node.func, ast.Name)
+            and node.func.id in ("_apipe", "_mpipe") and node.args
+            and isinstance(node.args[0], ast.Constant) and isinstance(node.args[0].value, str)
+        ):
+            label = "." + node.args[0].value
+            if node.func.id == "_mpipe":
+                label += "(" + ", ".join(map(ast.unparse, [*node.args[1:], *node.keywords])) + ")"
+            return label
+        return ast.unparse(node)
+
+    @staticmethod
+    def _attr_stage(stage):
         """
-        Transform the token stream to replace the pattern 'left |.attr' with 'left | _apipe('attr',...)'.
+        Return `(name, args, is_call)` if `stage` is a `|.name` or `|.name(...)` stage
+        (`_apipe('name')` / `_mpipe('name', ...)`) whose arguments are all constants
+        and can be inlined, else None.
         """
-        while editor.has_more():
-            current_token = editor.current
-            assert current_token; # for typing
-
-            # Check for the specific pattern: '| . NAME'
-            # Ensure there are enough tokens to peek ahead (at least 3: |, ., NAME)
-            dot_token = editor.peek(1)
-            name_token = editor.peek(2)
-
-            if (
-                current_token.type == token.OP and current_token.string == "|" and
-                dot_token and dot_token.type == token.OP and dot_token.string == "." and
-                name_token and name_token.type == token.NAME
-            ):
-
-                # We've matched '| . NAME'. Extract relevant tokens.
-
-                # Now, check for an optional argument list in parentheses: '( ... )'
-                # Start peeking from the token after 'NAME', which is at offset 3 from '|'
-                arg_start_offset = 3
-                args_within_parens = []
-                arg_start = editor.peek(arg_start_offset)
-
-                # Check if an opening parenthesis exists immediately after 'NAME'
-                if arg_start and arg_start.string == "(":
-                    depth = 1 # Keep track of parenthesis nesting level
-                    current_peek_offset = arg_start_offset + 1 # Move past the opening '('
-
-                    # Collect tokens until the matching closing parenthesis is found
-                    while editor.peek(current_peek_offset) and depth > 0:
-                        peeked_token = editor.peek(current_peek_offset)
-                        assert peeked_token; # for typing
-
-                        if peeked_token.string == "(":
-                            depth += 1
-                        elif peeked_token.string == ")":
-                            depth -= 1
-
-                        # Only append tokens that are *inside* the main parenthesis block
-                        # and not the final closing parenthesis itself
-                        if depth > 0:
-                            args_within_parens.append(peeked_token)
-
-                        current_peek_offset += 1 # Move to the next token to check
-
-                    # The total number of tokens consumed by this pattern, including '(', args, ')'
-                    total_consumed_tokens = current_peek_offset
-                else:
-                    # No parentheses found, so only '| . NAME' is consumed.
-                    total_consumed_tokens = arg_start_offset # Which is 3 tokens (|, ., NAME)
-
-                # Now, emit the transformed tokens: | _apipe('name', [args])
-                editor.append(type=token.OP, string="|")
-                editor.append(type=token.NAME, string="_apipe")
-                editor.append(type=token.OP, string="(")
-                editor.append(type=token.STRING, string=repr(name_token.string)) # 'name' as a string literal
-
-                if args_within_parens:
-                    editor.append(type=token.OP, string=",")
-                    # Append all collected argument tokens
-                    editor.extend(*args_within_parens)
-
-                editor.append(type=token.OP, string=")")
-
-                # Skip the original tokens that were consumed and replaced
-                editor.skip(total_consumed_tokens)
-
-                # Continue to the next iteration of the loop to process the next set of tokens
-                continue
+        if not (
+            isinstance(stage, ast.Call) and isinstance(stage.func, ast.Name)
+            and stage.func.id in ("_apipe", "_mpipe")
+            and not stage.keywords and stage.args
+            and isinstance(stage.args[0], ast.Constant) and isinstance(stage.args[0].value, str)
+        ):
+            return None
+        args = stage.args[1:]
+        if not all(isinstance(arg, ast.Constant) for arg in args):
+            return None
+        return stage.args[0].value, [ast.Constant(value=arg.value) for arg in args], stage.func.id == "_mpipe"
 
-            # If the special pattern was not matched, simply append the current token
-            # to the output list and move to the next token in the input stream.
-            editor.append_current()
-
-        # After the loop, return the final list of transformed tokens
+    @staticmethod
+    def _lambda_args(names):
+        return ast.arguments(
+            posonlyargs=[], args=[ast.arg(arg=name) for name in names], vararg=None,
+            kwonlyargs=[], kw_defaults=[], kwarg=None, defaults=[],
+        )
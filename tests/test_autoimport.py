@@ -79,3 +79,110 @@ def test_detect_and_add_imports_ast(input_code, expected_imports):
         f"Expected imports: {expected_imports}\n"
         f"Actual imports:   {actual_imports}\n"
     )
+
+
+def test_module_probing_is_cached(monkeypatch):
+    import importlib.util
+    from scriptpy.transformers import autoimport
+
+    autoimport.clear_import_cache()
+    calls = []
+    find_spec = importlib.util.find_spec
+    monkeypatch.setattr(importlib.util, "find_spec", lambda name, *a: calls.append(name) or find_spec(name, *a))
+
+    code = "free_var.append(1)\nfree_var.append(2)\nnot_a_module_xyz.attr\n"
+    detect_and_add_imports(code)
+    detect_and_add_imports(code)
+    assert sorted(calls) == ["free_var", "not_a_module_xyz"]
+
+
+def test_probed_modules_stay_imported():
+    import sys
+    from scriptpy.transformers import autoimport
+
+    autoimport.clear_import_cache()
+    sys.modules.pop("colorsys", None)
+    assert extract_imports(detect_and_add_imports("colorsys.rgb_to_hls(1, 1, 1)\n")) == ["import colorsys"]
+    # the module is not unloaded again, so the next evaluation doesn't re-import it
+    assert "colorsys" in sys.modules
+
+
+def test_lazy_imports():
+    import sys
+    import types
+    from scriptpy import custom_eval
+    from scriptpy.transformers import autoimport
+
+    autoimport.clear_import_cache()
+    sys.modules.pop("colorsys", None)
+    src = "f = lambda: colorsys.rgb_to_hsv(0, 0, 1)\nf"
+    f = custom_eval(src, lazy_imports=True, cache=False)
+    # bound, but not executed until an attribute is used
+    # (type() doesn't count as attribute access, LazyLoader resets the type on load)
+    assert type(sys.modules["colorsys"]) is not types.ModuleType
+    assert f() == (0.6666666666666666, 1.0, 1)
+    assert type(sys.modules["colorsys"]) is types.ModuleType
+
+
+def test_lazy_imports_statement():
+    code = dedent("""
+        value = math.pi
+        print(colorsys.ONE_THIRD)
+        """)
+    tree = ast.parse(code)
+    from scriptpy.transformers.autoimport import AutoImportTransformer
+
+    tree = ast.fix_missing_locations(AutoImportTransformer(lazy_imports=True).visit(tree))
+    assert [ast.unparse(stmt) for stmt in tree.body[:2]] == [
+        "colorsys = _lazy_import('colorsys')",
+        "math = _lazy_import('math')",
+    ]
+
+
+def test_bound_names_are_not_probed(monkeypatch):
+    import importlib.util
+    from scriptpy.transformers import autoimport
+
+    autoimport.clear_import_cache()
+    calls = []
+    find_spec = importlib.util.find_spec
+    monkeypatch.setattr(importlib.util, "find_spec", lambda name, *a: calls.append(name) or find_spec(name, *a))
+
+    code = dedent("""
+        import os as system
+        def f(param, *args, **kwargs):
+            return param.x, args.y, kwargs.z
+        for loop_var in []:
+            loop_var.x
+        [comp.x for comp in []]
+        with open(".") as handle:
+            handle.read()
+        str.upper, system.sep, free_name.attr
+        """)
+    assert extract_imports(detect_and_add_imports(code)) == ["import os"]
+    assert calls == ["free_name"]
+
+
+def test_only_module_scope_bindings_suppress_module_imports():
+    from scriptpy import custom_eval
+
+    # the first use of `time` is the module, only then it is rebound
+    assert custom_eval("time = time.time()\ntype(time)") is float
+    # a parameter named `json` doesn't make the module-level `json` a variable
+    assert custom_eval("def f(json): return json\njson.dumps([1])") == "[1]"
+    assert extract_imports(detect_and_add_imports("def f(json):\n    return json.x\n")) == []
+    assert extract_imports(detect_and_add_imports("json = {}\njson.get('a')\n")) == []
+    # names bound in a class body are not visible in its methods
+    assert custom_eval("class C:\n    json = 1\n    def f(self): return json.dumps([1])\nC().f()") == "[1]"
+    assert extract_imports(detect_and_add_imports("class C:\n    json = 1\n    x = json.real\n")) == []
+
+
+def test_globals_are_not_auto_imported():
+    from scriptpy import custom_eval
+
+    class Fake:
+        loads = staticmethod(lambda s: "fake")
+
+    # `json` is a variable here, the json module must not be imported over it
+    assert custom_eval("json.loads('{}')", {"json": Fake()}) == "fake"
+    assert custom_eval("json.loads('{}')") == {}
@@ -0,0 +1,102 @@
+import pytest
+
+from scriptpy import custom_eval, cache_info, cache_clear
+from scriptpy.cache import LRUCache
+
+
+def test_lru_cache_evicts_least_recently_used():
+    cache = LRUCache(maxsize=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1  # "a" is now the most recent
+    cache.put("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert cache.info() == (3, 1, 2, 2)
+
+
+def test_custom_eval_reuses_compiled_code():
+    cache_clear()
+    src = "numbers | str |.zfill(2)"
+    assert custom_eval(src, {"numbers": [1, 2]}) == ["01", "02"]
+    assert custom_eval(src, {"numbers": [3]}) == ["03"]
+    info = cache_info()
+    assert info.misses == 1
+    assert info.hits == 1
+    assert info.currsize == 1
+
+    cache_clear()
+    assert cache_info().currsize == 0
+
+
+def test_custom_eval_without_cache():
+    cache_clear()
+    assert custom_eval("1 + 1", cache=False) == 2
+    assert cache_info().currsize == 0
+
+
+def test_syntax_errors_are_not_cached():
+    cache_clear()
+    with pytest.raises(SyntaxError):
+        custom_eval("1 +")
+    assert cache_info().currsize == 0
+
+
+@pytest.fixture(autouse=True)
+def write_bytecode(monkeypatch):
+    # the cache honours PYTHONDONTWRITEBYTECODE, like __pycache__ does
+    monkeypatch.setattr("sys.dont_write_bytecode", False)
+
+
+def _write_script(tmp_path, text):
+    script = tmp_path / "job.py"
+    script.write_text(text)
+    return str(script)
+
+
+def test_script_bytecode_cache(tmp_path, capsys, monkeypatch):
+    from scriptpy import main as main_module
+    from scriptpy.cache import bytecode_cache_path
+
+    script = _write_script(tmp_path, "[1, -2] | abs")
+    main_module.main(["-s", script])
+    assert capsys.readouterr().out == "[1, 2]\n"
+    assert (tmp_path / "__pycache__").is_dir()
+    assert bytecode_cache_path(script).startswith(str(tmp_path / "__pycache__"))
+
+    # an unchanged script must not go through the transform pipeline again
+    def fail(*args, **kwargs):
+        raise AssertionError("script was recompiled")
+
+    monkeypatch.setattr(main_module, "compile_source", fail)
+    main_module.main(["-s", script])
+    assert capsys.readouterr().out == "[1, 2]\n"
+
+
+def test_script_bytecode_cache_invalidation(tmp_path, capsys):
+    from scriptpy import main as main_module
+
+    script = _write_script(tmp_path, "'old'")
+    main_module.main(["-s", script])
+    _write_script(tmp_path, "'new-value'")
+    main_module.main(["-s", script])
+    assert capsys.readouterr().out == "old\nnew-value\n"
+
+
+def test_script_no_cache(tmp_path, capsys):
+    from scriptpy import main as main_module
+
+    script = _write_script(tmp_path, "1 + 1")
+    main_module.main(["-s", script, "--no-cache"])
+    assert capsys.readouterr().out == "2\n"
+    assert not (tmp_path / "__pycache__").exists()
+
+
+def test_script_cache_respects_dont_write_bytecode(tmp_path, capsys, monkeypatch):
+    from scriptpy import main as main_module
+
+    monkeypatch.setattr("sys.dont_write_bytecode", True)
+    main_module.main(["-s", _write_script(tmp_path, "1 + 1")])
+    assert capsys.readouterr().out == "2\n"
+    assert not (tmp_path / "__pycache__").exists()
@@ -0,0 +1,65 @@
+import pytest
+
+from scriptpy import main as main_module
+from scriptpy.data import load_data
+from scriptpy.transformers.pipes import PipeableIter
+
+
+@pytest.fixture
+def data_file(tmp_path):
+    path = tmp_path / "data.txt"
+    path.write_text(" a \n b \nc")
+    return str(path)
+
+
+def test_data_modes(data_file):
+    assert load_data(data_file) == " a \n b \nc"
+    lines = load_data(data_file, "lines")
+    assert isinstance(lines, PipeableIter)
+    assert list(lines) == [" a ", " b ", "c"]
+    assert load_data(data_file, "mmap")[:] == b" a \n b \nc"
+    with pytest.raises(ValueError):
+        load_data(data_file, "csv-ish")
+
+
+def test_mmap_empty_file(tmp_path):
+    path = tmp_path / "empty"
+    path.write_bytes(b"")
+    assert load_data(str(path), "mmap") == b""
+
+
+def test_cli_data_lines(data_file, capsys):
+    main_module.main(["-d", data_file, "--data-mode", "lines", "data |.strip() |.upper()"])
+    assert capsys.readouterr().out == "['A', 'B', 'C']\n"
+
+
+def test_cli_data_mmap(data_file, capsys):
+    main_module.main(["-d", data_file, "--data-mode", "mmap", "data.find(b'c')"])
+    assert capsys.readouterr().out == "8\n"
+
+
+def test_structured_modes(tmp_path):
+    json_path = tmp_path / "data.json"
+    json_path.write_text('{"a": [1, 2]}')
+    assert load_data(str(json_path), "json") == {"a": [1, 2]}
+
+    jsonl_path = tmp_path / "data.jsonl"
+    jsonl_path.write_text('{"a": 1}\n\n{"a": 2}\n')
+    records = load_data(str(jsonl_path), "jsonl")
+    assert isinstance(records, PipeableIter)
+    assert list(records) == [{"a": 1}, {"a": 2}]
+
+    csv_path = tmp_path / "data.csv"
+    csv_path.write_text('name,size\nx,1\n"y, z",2\n')
+    rows = load_data(str(csv_path), "csv")
+    assert isinstance(rows, PipeableIter)
+    assert list(rows) == [{"name": "x", "size": "1"}, {"name": "y, z", "size": "2"}]
+
+
+def test_cli_structured(tmp_path, capsys):
+    path = tmp_path / "data.csv"
+    path.write_text("name,size\nx,1\ny,2\n")
+    main_module.main(["--csv", "-d", str(path), "sum(data | .get('size') | int)"])
+    assert capsys.readouterr().out == "3\n"
+    main_module.main(["--csv", "-d", str(path), "-n", "line['name']"])
+    assert capsys.readouterr().out == "x\ny\n"
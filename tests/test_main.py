@@ -1,3 +1,6 @@
+import io
+import pytest
+
 from scriptpy import custom_eval
 
 
@@ -64,3 +67,92 @@ def test_fix_balance():
     src = "{9:[1,[2,],[3,{'a':[4"
     result = custom_eval(src)
     assert result == {9: [1, [2], [3, {"a": [4]}]]}
+
+
+def test_fix_balance_multiline_and_shell():
+    assert custom_eval("[1,\n2,\n[3") == [1, 2, [3]]
+    assert custom_eval("$('echo hi'") == "hi"
+
+
+def test_fix_balance_single_tokenize(monkeypatch):
+    import tokenize
+
+    calls = []
+    generate_tokens = tokenize.generate_tokens
+    monkeypatch.setattr(tokenize, "generate_tokens", lambda *a: calls.append(a) or generate_tokens(*a))
+    monkeypatch.setattr(tokenize, "tokenize", lambda *a: calls.append(a) or [])
+    assert custom_eval("sum([1, 2", cache=False) == 3
+    assert len(calls) == 1
+
+
+def test_unterminated_string_is_not_balanced():
+    import tokenize
+
+    with pytest.raises(tokenize.TokenError):
+        custom_eval('("""abc')
+
+
+def test_compile_run_many():
+    import scriptpy
+
+    compiled = scriptpy.compile("total = sum(row | abs)\ntotal * factor")
+    assert compiled.run({"row": [-1, 2], "factor": 10}) == 30
+    results = compiled.run_many({"row": [i, -i], "factor": 1} for i in range(3))
+    assert list(results) == [0, 2, 4]
+
+
+def test_compile_statements_only():
+    import scriptpy
+
+    compiled = scriptpy.compile("x = 1")
+    assert compiled.run() is None
+    assert list(compiled.run_many([{}, {}])) == [None, None]
+
+
+def test_per_line_mode(tmp_path, capsys, monkeypatch):
+    from scriptpy.main import main
+
+    path = tmp_path / "in.txt"
+    path.write_text("a b\nc\n\nd e f\n")
+    main(["-n", "-d", str(path), "line.upper() if line else None"])
+    assert capsys.readouterr().out == "A B\nC\nD E F\n"
+
+    main(["-p", "-d", str(path), "line = line[::-1]"])
+    assert capsys.readouterr().out == "b a\nc\n\nf e d\n"
+
+    monkeypatch.setattr("sys.stdin", io.StringIO(path.read_text()))
+    main(["--begin", "words = 0", "-n", "words += len(line.split())", "--end", "words"])
+    assert capsys.readouterr().out == "6\n"
+
+
+def test_per_line_output_order(capsys, monkeypatch):
+    from scriptpy.main import main
+
+    # what the code prints is interleaved with the results, not written before them
+    monkeypatch.setattr("sys.stdin", io.StringIO("a\nb\n"))
+    main(["-n", "print('x'); line"])
+    assert capsys.readouterr().out == "x\na\nx\nb\n"
+
+
+def test_per_line_requires_mode():
+    from scriptpy.main import main
+
+    with pytest.raises(SystemExit):
+        main(["--end", "1", "1"])
+    for mode in (["--json"], ["--data-mode", "mmap"]):
+        with pytest.raises(SystemExit):
+            main(["-n", *mode, "-d", "-", "line"])
+
+
+def test_package_transformers_is_the_list():
+    import os
+    import subprocess
+    import sys
+    from pathlib import Path
+
+    # in a fresh interpreter: loading the transformers subpackage must not replace the list
+    code = ("from scriptpy import custom_eval; custom_eval('[1] | str')\n"
+            "from scriptpy import transformers; assert isinstance(transformers, list), transformers\n"
+            "import scriptpy.transformers.pipes, scriptpy; assert scriptpy.transformers is transformers")
+    env = dict(os.environ, PYTHONPATH=str(Path(__file__).resolve().parent.parent))
+    subprocess.run([sys.executable, "-c", code], env=env, check=True)
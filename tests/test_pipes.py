@@ -0,0 +1,149 @@
+import itertools
+
+import pytest
+
+from scriptpy import custom_eval
+from scriptpy.transformers.pipes import PipeableIter, PipeableList
+
+
+def test_lazy_pipe_matches_eager():
+    src = "['a b', 'c'] |.split | len"
+    assert custom_eval(src, lazy=True) == custom_eval(src) == [2, 1]
+    assert isinstance(custom_eval(src, lazy=True), PipeableList)
+
+
+def test_lazy_pipe_streams():
+    # an infinite source only works if the stages are chained generators
+    src = "it = numbers | str |.zfill(3)\nnext(iter(it)), next(iter(it))"
+    assert custom_eval(src, {"numbers": itertools.count()}, lazy=True) == ("000", "001")
+
+
+def test_lazy_pipe_consumed_inside_snippet():
+    calls = []
+    src = "sum(numbers | track | abs)"
+    result = custom_eval(src, {"numbers": range(-3, 0), "track": lambda x: calls.append(x) or x}, lazy=True)
+    assert result == 6
+    assert calls == [-3, -2, -1]
+
+
+def test_eager_pipe_keeps_streams_lazy():
+    # a PipeableIter source (e.g. streamed input) stays lazy even in eager mode
+    result = custom_eval("lines | str.upper", {"lines": PipeableIter(iter(["a", "b"]))})
+    assert result == ["A", "B"]
+
+
+def test_fused_chain_is_a_single_call(capsys):
+    src = "['abc', 'bcd'] |.replace('c', 'x') |.upper | len"
+    assert custom_eval(src, verbose=True, cache=False) == [3, 3]
+    transformed = capsys.readouterr().out
+    assert transformed.count("_fpipe(") == 1
+    assert "_x.replace('c', 'x')" in transformed
+    assert "_lpipe" not in transformed
+
+
+def test_fused_chain_semantics():
+    # stage values are evaluated once, before any element is processed
+    calls = []
+    src = "numbers | make(1) | make(2)"
+    make = lambda n: calls.append(n) or (lambda x: x * 10 + n)
+    assert custom_eval(src, {"numbers": [0, 1], "make": make}) == [12, 112]
+    assert calls == [1, 2]
+
+    # `|.name` returns plain attributes, `|.name(...)` with variables still works
+    assert custom_eval("[1 + 2j] |.imag | int") == [2]
+    assert custom_eval("sep = ','\n['a,b'] |.split(sep) | len") == [2]
+    # pipes inside comprehension iterables and class bodies
+    assert custom_eval("[y for y in ['a'] |.upper()]") == ["A"]
+    assert custom_eval("class C:\n    z = ['a'] |.upper\nC.z") == ["A"]
+
+
+def test_fused_chain_fallback():
+    # non-pipeable operands keep the plain `|` meaning
+    assert custom_eval("1 | 2 | 4") == 7
+    with pytest.raises(TypeError, match="must be callable"):
+        custom_eval("[1] | abs | 3")
+
+
+def test_parallel_stage_threads():
+    import threading
+    import time
+
+    def slow(x):
+        time.sleep(0.05)
+        return x, threading.current_thread().name
+
+    start = time.perf_counter()
+    result = custom_eval("numbers | par(slow, workers=8) | (lambda r: r[0] * 2)", {"numbers": range(8), "slow": slow})
+    elapsed = time.perf_counter() - start
+    assert result == [0, 2, 4, 6, 8, 10, 12, 14]
+    assert elapsed < 0.05 * 8 / 2  # ran concurrently
+
+
+def test_parallel_stage_processes():
+    src = "numbers |.__neg__() | par(abs, workers=2, chunksize=4, processes=True)"
+    assert custom_eval(src, {"numbers": range(10)}) == list(range(10))
+    assert custom_eval(src, {"numbers": range(3)}, lazy=True) == [0, 1, 2]
+
+
+def test_parallel_stage_pool_reuse():
+    from scriptpy.transformers.pipes import _pools, shutdown_pools
+
+    shutdown_pools()
+    custom_eval("range(4) | par(str, workers=3)")
+    custom_eval("range(4) | par(abs, workers=3)")
+    assert len(_pools) == 1
+    shutdown_pools()
+    assert not _pools
+
+
+def test_trace_pipes(capsys):
+    from scriptpy.transformers.pipes import PipeTrace
+
+    trace = PipeTrace()
+    src = "data |.split(',') | parse |.get('x')"
+    parse = lambda parts: {"x": int(parts[1])}
+    globals_ = {"data": ["a,1", "b,2", "c,3"], "parse": parse}
+    assert custom_eval(src, globals_, trace_pipes=trace) == [1, 2, 3]
+    assert custom_eval(src, globals_, trace_pipes=trace, lazy=True) == [1, 2, 3]
+    (labels, stages), = trace.chains.items()
+    assert labels == ("data", ".split(',')", "parse", ".get('x')")
+    assert [(s.calls, s.elements) for s in stages] == [(2, 6)] * 3
+    assert all(s.seconds > 0 and s.peak_bytes > 0 for s in stages)
+
+    assert custom_eval("[1, 2] | str", trace_pipes=True) == ["1", "2"]
+    err = capsys.readouterr().err
+    assert err.startswith("pipe: [1, 2] | str\n")
+    assert "elements" in err
+
+
+def test_pipe_labels_only_when_tracing():
+    import scriptpy
+    from scriptpy.transformers.pipes import PipeTrace
+
+    # labels cost transform time and constants, so untraced code doesn't carry them
+    assert "'str'" not in repr(scriptpy.compile("[1, 2] | str").codes[1].co_consts)
+    trace = PipeTrace()
+    assert scriptpy.compile("[1, 2] | str").run(trace_pipes=trace) == ["1", "2"]
+    assert list(trace.chains) == [("<pipe>", "stage 0")]
+
+
+def test_numpy_array_pipes():
+    np = pytest.importorskip("numpy")
+    arr = np.array([1.0, 4.0, 9.0])
+
+    result = custom_eval("arr | np.sqrt | np.negative", {"arr": arr, "np": np})
+    assert isinstance(result, np.ndarray)
+    assert result.tolist() == [-1.0, -2.0, -3.0]
+    result = custom_eval("arr / 3 |.round(2) |.astype(str)", {"arr": arr}, lazy=True)
+    assert isinstance(result, np.ndarray) and result.tolist() == ["0.33", "1.33", "3.0"]
+    vectorized = np.vectorize(lambda x: x + 1)
+    assert custom_eval("arr | f", {"arr": arr, "f": vectorized}).tolist() == [2.0, 5.0, 10.0]
+
+    # after the first stage that can't be vectorized, stages apply element by element
+    assert custom_eval("arr | np.sqrt | int | str", {"arr": arr, "np": np}) == ["1", "2", "3"]
+    assert custom_eval("arr | float", {"arr": arr}) == [1.0, 4.0, 9.0]
+    # attributes that aren't element-wise, and rows of n-D arrays, keep the element-wise meaning
+    assert custom_eval("arr |.cumsum()", {"arr": arr}) == [1.0, 4.0, 9.0]
+    matrix = np.array([[1, 2], [3, 4]])
+    assert [row.tolist() for row in custom_eval("m |.round()", {"m": matrix})] == [[1, 2], [3, 4]]
+    assert custom_eval("m | np.negative", {"m": matrix, "np": np}).tolist() == [[-1, -2], [-3, -4]]
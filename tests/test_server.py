@@ -0,0 +1,89 @@
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+ROOT = str(Path(__file__).resolve().parent.parent)
+
+
+@pytest.fixture
+def server(tmp_path):
+    env = dict(os.environ, SCRIPTPY_SOCKET=str(tmp_path / "scriptpy.sock"), PYTHONPATH=ROOT)
+    process = subprocess.Popen([sys.executable, "-m", "scriptpy", "--server"], env=env, stderr=subprocess.PIPE)
+    deadline = time.monotonic() + 10
+    while not os.path.exists(env["SCRIPTPY_SOCKET"]):
+        assert process.poll() is None and time.monotonic() < deadline, "the server did not start"
+        time.sleep(0.01)
+    yield env
+    process.terminate()
+    process.wait(10)
+    assert not os.path.exists(env["SCRIPTPY_SOCKET"])
+
+
+def client(env, *args, **kwargs):
+    return subprocess.run([sys.executable, "-m", "scriptpy.client", *args], env=env, capture_output=True,
+                          text=True, **kwargs)
+
+
+def test_server_runs_client_commands(server, tmp_path):
+    result = client(server, "-d-", "data.upper()", input="hello\n")
+    assert (result.returncode, result.stdout) == (0, "HELLO\n\n")
+
+    result = client(dict(server, GREETING="hi"), '$("echo $GREETING; pwd")', cwd=tmp_path)
+    assert result.stdout.split() == ["hi", str(tmp_path)]
+
+    result = client(server, "-n", "int(line) * 2", input="1\n2\n")
+    assert result.stdout == "2\n4\n"
+
+
+def test_server_exit_status(server):
+    result = client(server, "1 / 0")
+    assert result.returncode == 1
+    assert "ZeroDivisionError" in result.stderr
+    assert client(server, "--no-such-option").returncode == 2
+
+
+def test_server_drops_malformed_requests(server):
+    import json
+    import socket
+    import struct
+
+    for request in ({"argv": ["1"]}, ["1"]):
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.connect(server["SCRIPTPY_SOCKET"])
+            header = json.dumps(request).encode()
+            sock.sendmsg([struct.pack(">I", len(header)), header],
+                          [(socket.SOL_SOCKET, socket.SCM_RIGHTS, struct.pack("3i", 0, 1, 2))])
+            assert sock.recv(4) == b""  # closed without a status
+    assert client(server, "6 * 7").stdout == "42\n"
+
+
+def test_client_without_server(tmp_path):
+    env = dict(os.environ, SCRIPTPY_SOCKET=str(tmp_path / "missing.sock"), PYTHONPATH=ROOT)
+    assert client(env, "6 * 7").stdout == "42\n"
+
+
+def test_default_socket_directory_is_private(monkeypatch, tmp_path):
+    from scriptpy.client import check_private_directory, default_socket_path
+
+    monkeypatch.delenv("SCRIPTPY_SOCKET", raising=False)
+    monkeypatch.delenv("XDG_RUNTIME_DIR", raising=False)
+    assert default_socket_path() == f"/tmp/scriptpy-{os.getuid()}/scriptpy.sock"
+
+    directory = tmp_path / "private"
+    check_private_directory(str(directory), create=True)
+    assert directory.stat().st_mode & 0o777 == 0o700
+    directory.chmod(0o755)
+    with pytest.raises(PermissionError):
+        check_private_directory(str(directory))
+
+
+@pytest.mark.skipif(not hasattr(os, "getuid") or os.getuid() != 0, reason="needs root to chown the socket")
+def test_client_ignores_socket_of_another_user(server):
+    os.chown(server["SCRIPTPY_SOCKET"], 65534, 65534)
+    result = client(server, "6 * 7")
+    assert result.stdout == "42\n"
+    assert "belongs to another user" in result.stderr
@@ -0,0 +1,102 @@
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+from scriptpy import custom_eval
+
+ROOT = str(Path(__file__).resolve().parent.parent)
+
+
+def test_shell_stream():
+    assert custom_eval("""$<("printf 'a\\nb\\n'") |.upper()""") == ["A", "B"]
+    assert custom_eval("""sum($<("seq 1 100") | int)""") == 5050
+
+
+def test_shell_stream_exit_code():
+    with pytest.raises(subprocess.CalledProcessError) as info:
+        custom_eval("""list($<("echo a; exit 3"))""")
+    assert info.value.returncode == 3
+
+
+def test_shell_stream_is_lazy():
+    # `yes` never ends, only the first lines are read and the process is killed
+    start = time.perf_counter()
+    assert custom_eval("""lines = iter($<("yes"))\n[next(lines), next(lines)]""") == ["y", "y"]
+    assert time.perf_counter() - start < 5
+
+
+def test_shell_exec_many():
+    assert custom_eval("""$["echo a", "echo b"]""") == ["a", "b"]
+    src = """$[range(3) | (lambda i: f"sleep 0.{3 - i}; echo {i}")]"""
+    start = time.perf_counter()
+    assert custom_eval(src) == ["0", "1", "2"]  # input order, not completion order
+    assert time.perf_counter() - start < 0.6  # ran concurrently
+
+
+def test_shell_exec_many_limit_and_timeout():
+    assert custom_eval("""_shell_exec_many(["echo 1"] * 4, limit=2)""") == ["1"] * 4
+    with pytest.raises(subprocess.TimeoutExpired):
+        custom_eval("""_shell_exec_many(["sleep 5"], timeout=0.1)""")
+    with pytest.raises(subprocess.CalledProcessError):
+        custom_eval("""$["true", "exit 2"]""")
+
+
+@pytest.fixture
+def shell_session():
+    from scriptpy.transformers.command import use_shell_session
+
+    yield use_shell_session()
+    use_shell_session(False)
+
+
+def test_multi_assignment_detection():
+    assert custom_eval("""out, err, code = $("echo hi"); code""") == 0
+    # the comma of the rewritten `|.strip()` is not a multi-assignment
+    assert custom_eval("""x = ["a"] |.strip() | (lambda v: $("echo hi"))\nx""") == ["hi"]
+    # neither is a comma on an earlier line
+    assert custom_eval("""a, b = 1, 2\nx = $("echo hi")\nx""") == "hi"
+
+
+def test_shell_session(shell_session):
+    assert custom_eval("""$("echo a; printf b")""") == "a\nb"
+    assert custom_eval("""out, err, code = $("echo out; echo err >&2; exit 3"); (out, err, code)""") == ("out", "err", 3)
+    with pytest.raises(subprocess.CalledProcessError):
+        custom_eval("""$("false")""")
+    # one shell for all commands
+    pid = custom_eval("""$("echo $$")""")
+    assert custom_eval("""$("echo $$")""") == pid
+
+
+def test_shell_session_recovers(shell_session):
+    assert custom_eval("""_, _, code = $("exit 4"); code""") == 4
+    assert custom_eval("""_, err, code = $("echo '"); code""") != 0  # shell syntax error
+    with pytest.raises(subprocess.TimeoutExpired):
+        shell_session.run("sleep 5", timeout=0.1)
+    assert custom_eval("""$("echo ok")""") == "ok"
+
+
+def test_shell_exec_bytes(tmp_path):
+    assert custom_eval("""$b("printf 'a\\\\0b\\\\n'")""") == b"a\x00b\n"
+    assert custom_eval("""$b("printf hello", "tr a-z A-Z", "rev")""") == b"OLLEH"
+    assert custom_eval("""$b("yes", "head -n 2")""") == b"y\ny\n"  # SIGPIPE in `yes` is fine
+    data = bytes(range(256)) * 4096
+    assert custom_eval("""_shell_exec_bytes("cat", "cat", input=data)""", {"data": data}) == data
+    path = tmp_path / "in.bin"
+    path.write_bytes(data)
+    with open(path, "rb") as f:
+        assert custom_eval("""_shell_exec_bytes("wc -c", input=f)""", {"f": f}).strip() == str(len(data)).encode()
+    with pytest.raises(subprocess.CalledProcessError):
+        custom_eval("""$b("exit 1", "cat")""")
+    with pytest.raises(TypeError):  # the error of Popen, not one from the cleanup
+        custom_eval("""$b(None)""")
+
+
+def test_subprocess_imported_on_first_shell_command():
+    code = ("import sys; from scriptpy import custom_eval; custom_eval('[1, 2] | str')\n"
+            "assert 'subprocess' not in sys.modules\n"
+            "assert custom_eval('$(\"echo hi\")') == 'hi'")
+    subprocess.run([sys.executable, "-c", code], env=dict(os.environ, PYTHONPATH=ROOT), check=True)
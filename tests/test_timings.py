@@ -0,0 +1,41 @@
+from scriptpy import custom_eval, main as main_module
+from scriptpy.timings import NO_TIMINGS, Timings
+
+
+def test_custom_eval_timings():
+    timings = Timings()
+    assert custom_eval("data | str |.upper()", {"data": [1]}, cache=False, timings=timings) == ["1"]
+    assert list(timings.phases) == [
+        "tokenize", "token rewrite", "parse",
+        "transform: ShellTransformer", "transform: PipeTransformer", "transform: AutoImportTransformer",
+        "compile", "run",
+    ]
+    assert timings.cache_hit is False
+    assert timings.total == sum(timings.phases.values()) > 0
+    assert "transform: AutoImportTransformer" in timings.report()
+
+    timings = Timings()
+    custom_eval("data | str |.upper()", {"data": [1]}, timings=timings)
+    custom_eval("data | str |.upper()", {"data": [1]}, timings=timings)
+    assert timings.cache_hit is True
+
+
+def test_profile_run_phase():
+    timings = Timings(profile=True)
+    custom_eval("sorted(range(10), key=abs)", timings=timings)
+    assert timings.stats is not None
+    assert any(func[2] == "<built-in method builtins.sorted>" for func in timings.stats.stats)
+
+
+def test_no_timings_is_inert():
+    with NO_TIMINGS.phase("run", profile=True):
+        pass
+    NO_TIMINGS.cache_hit = True
+    assert NO_TIMINGS.cache_hit is None
+
+
+def test_cli_timings(capsys):
+    main_module.main(["--timings", "1 + 1"])
+    out, err = capsys.readouterr()
+    assert out == "2\n"
+    assert "run" in err and "total" in err
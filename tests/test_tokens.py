@@ -0,0 +1,77 @@
+import io
+import token
+import tokenize
+
+from scriptpy.TokenEditor import TokenEditor
+from scriptpy.baseTransformer import BaseTransformer, rewrite_tokens
+from scriptpy.transformers import PipeTransformer, ShellTransformer, transformers
+
+
+def rewrite(src, transformer_list):
+    editor = TokenEditor(list(tokenize.generate_tokens(io.StringIO(src).readline)))
+    rewrite_tokens(editor, transformer_list)
+    # untokenize's spacing is an implementation detail, compare without it
+    return "".join(tokenize.untokenize(editor.as_token_list()).split())
+
+
+def test_fused_rewrite():
+    src = "x = $(cmd(a)) |.replace('a', 'b') |.upper"
+    assert rewrite(src, transformers) == (
+        "x=_shell_exec(cmd(a))|_mpipe('replace','a','b')|_apipe('upper')"
+    )
+
+
+def test_single_transformer_pass():
+    assert rewrite("$('ls') |.strip", [ShellTransformer]) == "_shell_exec('ls')|.strip"
+    assert rewrite("$('ls') |.strip", [PipeTransformer]).endswith("|_apipe('strip')")
+
+
+def rewrite_double_bang(editor):
+    nxt = editor.peek(1)
+    if not (nxt and nxt.string == "!"):
+        return False
+    editor.skip(2)
+    editor.append(type=token.OP, string="*")
+    editor.append(type=token.OP, string="*")
+    return True
+
+
+class PowerTransformer(BaseTransformer):
+    token_patterns = {"!": rewrite_double_bang}
+
+
+class LegacyTransformer(BaseTransformer):
+    @staticmethod
+    def token_level_transform(editor):
+        while editor.has_more():
+            current = editor.current
+            if current.type == token.NUMBER:
+                editor.append(type=token.NUMBER, string=str(int(current.string) + 1))
+                editor.skip()
+            else:
+                editor.append_current()
+
+
+def test_custom_token_patterns():
+    # "!" tokenizes as an ERRORTOKEN (or OP on 3.12+), patterns match on the string
+    assert rewrite("2 !! 3", [PowerTransformer]) == "2**3"
+    assert rewrite("2 !! 3", [PowerTransformer, LegacyTransformer]) == "3**4"
+
+
+def test_token_editor_storage():
+    toks = list(tokenize.generate_tokens(io.StringIO("a = a + b\n").readline))
+    editor = TokenEditor(iter(toks))  # generators are accepted too
+    assert editor.current == (token.NAME, "a")
+    assert editor.peek(3).string == "+"
+    # repeated strings share one object
+    assert editor.current.string is editor.peek(2).string
+
+    editor.append_current()
+    editor.skip()
+    editor.append(token.OP, "+=")
+    editor.commit()
+    assert editor.current == (token.NAME, "a")
+    assert editor.get_output_history(5) == []
+    editor.drain()
+    assert "".join(t.string for t in editor.get_result()) == "a+=a+b\n"
+    assert editor.get_output_history(2) == [(token.NEWLINE, "\n"), (token.ENDMARKER, "")]